@@ -0,0 +1,89 @@
+"""
+Benchmark del serializador de respuestas sobre un payload de dashboard de 5.000 pedidos.
+
+Compara el camino anterior (clean_decimals en el handler + clean_decimals en
+response() + json.dumps(default=str)) contra chinawok_common.dumps (una sola
+pasada, orjson si está disponible).
+
+Uso (desde layers/chinawok_common):
+
+    python benchmarks/bench_serializer.py [--orders 5000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from chinawok_common import serialization  # noqa: E402
+
+STATUSES = ["PENDIENTE", "COCINANDO", "EMPACANDO", "EN_REPARTO", "ENTREGADO", "CANCELADO"]
+
+
+def clean_decimals(obj):
+    """Copia de la función que estaba duplicada en cada servicio."""
+    if isinstance(obj, list):
+        return [clean_decimals(i) for i in obj]
+    if isinstance(obj, dict):
+        return {k: clean_decimals(v) for k, v in obj.items()}
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    return obj
+
+
+def build_orders(n):
+    """Pedidos tal como los devuelve DynamoDB (números como Decimal)."""
+    return [
+        {
+            "order_id": f"{i:032x}",
+            "tenant_id": "LIMA_CENTRO",
+            "customer_id": f"user{i % 700}",
+            "status": STATUSES[i % len(STATUSES)],
+            "items": [
+                {"product_id": "POLLO_ARROZ", "quantity": Decimal("2"), "price": Decimal("15.50")},
+                {"product_id": "ROLLO_PRIMAVERA", "quantity": Decimal("3"), "price": Decimal("4.00")},
+            ],
+            "total": Decimal("43.00"),
+            "created_at": "2025-01-31T12:00:00.000000+00:00",
+            "updated_at": "2025-01-31T12:10:00.000000+00:00",
+            "tiempo_espera_minutos": 10.0,
+            "pasos_completados": Decimal(i % 5),
+        }
+        for i in range(n)
+    ]
+
+
+def legacy(orders):
+    # handler: clean_decimals por pedido + response(): clean_decimals + json.dumps
+    body = {"orders": [dict(o, items=clean_decimals(o["items"])) for o in orders]}
+    return json.dumps(clean_decimals(body), default=str)
+
+
+def single_pass(orders):
+    return serialization.dumps({"orders": orders})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    orders = build_orders(args.orders)
+    assert json.loads(legacy(orders)) == json.loads(single_pass(orders))
+
+    results = {}
+    for name, fn in (("legacy", legacy), ("chinawok_common", single_pass)):
+        best = min(timeit.repeat(lambda: fn(orders), number=1, repeat=args.repeat))
+        results[name] = best
+        print(f"{name:<16} {best * 1000:8.2f} ms")
+
+    print(f"backend: {serialization.BACKEND}  speedup: {results['legacy'] / results['chinawok_common']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+chinawok_common: código compartido por los microservicios (Lambda layer).
+
+Se importa igual en todos los servicios:
+
+    from chinawok_common import response, publish_order_event
+"""
+from . import aws
+from .aws import to_dynamo_item, from_dynamo_item
+from .serialization import dumps
+from .http import response, CORS_HEADERS, etag_for, etag_matches, if_none_match, not_modified
+from .cache import TTLCache
+from .events import (
+    EventPublisher, EventPublishError, publish_order_event, put_event_entries,
+    PUT_EVENTS_MAX_ENTRIES, PUT_EVENTS_MAX_BYTES,
+)
+from .pagination import parse_limit, encode_cursor, decode_cursor
+from .keys import tenant_customer_key, status_created_key, pending_step_key, order_history_key, history_event_key
+from .history import history_item, history_put, history_table_name, SOURCE_WORKFLOW, SOURCE_EVENTBRIDGE
+from .idempotency import idempotent, get_idempotency_key
+from .metrics import emit_metrics
+from .tenant_stats import (
+    stats_update_actions, stats_batch_update_actions, tenant_stats_table_name, registered_tenants,
+    STATS_KEY_ALL, stats_day_key,
+)
@@ -0,0 +1,152 @@
+"""
+Registro de clientes AWS perezoso y memoizado por contenedor.
+
+- boto3 se importa recién en el primer uso (los handlers que responden 400 antes
+  de tocar AWS no pagan ese costo en el cold start).
+- Todos los clientes/recursos comparten una sola sesión de botocore y un Config
+  afinado (keep-alive, pool de conexiones, reintentos adaptativos).
+- timings() expone cuánto costó importar boto3 y crear cada cliente.
+
+Uso en un handler (a nivel de módulo, no crea nada hasta el primer uso):
+
+    from chinawok_common import aws
+    table = aws.lazy_table(os.environ["ORDERS_TABLE"])
+    stepfunctions = aws.lazy_client("stepfunctions")
+"""
+import os
+import threading
+import time
+
+_lock = threading.RLock()
+_session = None
+_config = None
+_clients = {}
+_resources = {}
+_tables = {}
+_timings = {}
+_serializer = None
+_deserializer = None
+
+
+def _log_timing(name, seconds):
+    _timings[name] = round(seconds * 1000, 2)  # ms
+    if os.environ.get("LOG_AWS_TIMINGS") == "1":
+        print(f"[aws] {name}: {_timings[name]} ms")
+
+
+def _get_session():
+    global _session, _config
+    if _session is None:
+        with _lock:
+            if _session is None:
+                started = time.perf_counter()
+                import boto3
+                from botocore.config import Config
+                _log_timing("import:boto3", time.perf_counter() - started)
+
+                _config = Config(
+                    tcp_keepalive=True,
+                    max_pool_connections=int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "50")),
+                    connect_timeout=float(os.environ.get("AWS_CONNECT_TIMEOUT", "2")),
+                    read_timeout=float(os.environ.get("AWS_READ_TIMEOUT", "10")),
+                    retries={
+                        "mode": "adaptive",
+                        "max_attempts": int(os.environ.get("AWS_MAX_ATTEMPTS", "5")),
+                    },
+                )
+                _session = boto3.session.Session()
+    return _session
+
+
+def client(service_name, endpoint_url=None):
+    """
+    Cliente boto3 memoizado (uno por servicio y contenedor).
+    endpoint_url: para APIs con endpoint propio (ej. apigatewaymanagementapi).
+    """
+    key = (service_name, endpoint_url)
+    cached = _clients.get(key)
+    if cached is not None:
+        return cached
+    with _lock:
+        if key not in _clients:
+            session = _get_session()
+            started = time.perf_counter()
+            _clients[key] = session.client(service_name, config=_config, endpoint_url=endpoint_url)
+            _log_timing(f"client:{service_name}", time.perf_counter() - started)
+    return _clients[key]
+
+
+def resource(service_name):
+    """Resource boto3 memoizado (uno por servicio y contenedor)."""
+    cached = _resources.get(service_name)
+    if cached is not None:
+        return cached
+    with _lock:
+        if service_name not in _resources:
+            session = _get_session()
+            started = time.perf_counter()
+            _resources[service_name] = session.resource(service_name, config=_config)
+            _log_timing(f"resource:{service_name}", time.perf_counter() - started)
+    return _resources[service_name]
+
+
+def table(table_name):
+    """Table de DynamoDB memoizada por nombre."""
+    cached = _tables.get(table_name)
+    if cached is not None:
+        return cached
+    with _lock:
+        if table_name not in _tables:
+            _tables[table_name] = resource("dynamodb").Table(table_name)
+    return _tables[table_name]
+
+
+class _Lazy:
+    """Proxy que crea el objeto real en el primer acceso a un atributo."""
+
+    __slots__ = ("_factory", "_target")
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+
+    def __getattr__(self, name):
+        target = self._target
+        if target is None:
+            target = self._target = self._factory()
+        return getattr(target, name)
+
+
+def lazy_client(service_name, endpoint_url=None):
+    return _Lazy(lambda: client(service_name, endpoint_url))
+
+
+def lazy_resource(service_name):
+    return _Lazy(lambda: resource(service_name))
+
+
+def lazy_table(table_name):
+    return _Lazy(lambda: table(table_name))
+
+
+def to_dynamo_item(item):
+    """Serializa un dict (con Decimals) al formato tipado del cliente DynamoDB."""
+    global _serializer
+    if _serializer is None:
+        from boto3.dynamodb.types import TypeSerializer
+        _serializer = TypeSerializer()
+    return {k: _serializer.serialize(v) for k, v in item.items()}
+
+
+def from_dynamo_item(item):
+    """Inverso de to_dynamo_item: item tipado del cliente DynamoDB -> dict (Decimals)."""
+    global _deserializer
+    if _deserializer is None:
+        from boto3.dynamodb.types import TypeDeserializer
+        _deserializer = TypeDeserializer()
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+
+def timings():
+    """Milisegundos de import de boto3 y de creación de cada cliente en este contenedor."""
+    return dict(_timings)
@@ -0,0 +1,234 @@
+"""
+Publicación de eventos en EventBridge.
+
+EventPublisher acumula las entradas de una invocación y las envía en llamadas
+PutEvents de hasta 10 entradas (y 256 KB). PutEvents puede aceptar la llamada
+y rechazar entradas sueltas (FailedEntryCount): solo esas se reintentan, con
+backoff exponencial con jitter. Lo que no se pudo publicar se loguea y se
+cuenta en métricas EMF (EventsPublished / EventsRetried / EventsFailed).
+
+    publisher = EventPublisher("fulfillment.service")
+    publisher.add("CocinaIniciada", {"order_id": "...", ...})
+    failed = publisher.flush()
+"""
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from . import aws
+from .metrics import emit_metrics
+from .serialization import dumps
+
+# Límites de PutEvents: entradas por llamada y tamaño (por entrada y por llamada)
+PUT_EVENTS_MAX_ENTRIES = 10
+PUT_EVENTS_MAX_BYTES = 256 * 1024
+
+# Códigos de error por entrada que no mejoran reintentando
+NON_RETRYABLE_ERRORS = {
+    "MalformedDetail",
+    "InvalidArgument",
+    "ValidationException",
+    "AccessDeniedException",
+    "NotAuthorizedForSourceException",
+    "NotAuthorizedForDetailTypeException",
+    "EntryTooLarge",
+}
+
+EVENTS_MAX_ATTEMPTS = int(os.environ.get("EVENTS_MAX_ATTEMPTS", "4"))
+EVENTS_BASE_DELAY = float(os.environ.get("EVENTS_BASE_DELAY", "0.05"))
+EVENTS_MAX_DELAY = float(os.environ.get("EVENTS_MAX_DELAY", "1.0"))
+
+events_client = aws.lazy_client("events")
+
+
+class EventPublishError(Exception):
+    """Entradas que no se pudieron publicar tras los reintentos."""
+
+    def __init__(self, failed):
+        super().__init__(f"{len(failed)} eventos sin publicar")
+        self.failed = failed
+
+
+def entry_size(entry):
+    """Tamaño de una entrada según el cálculo de EventBridge (Time cuenta 14 bytes)."""
+    size = 14 if entry.get("Time") else 0
+    for field in ("Source", "DetailType", "Detail"):
+        if entry.get(field):
+            size += len(entry[field].encode("utf-8"))
+    for resource in entry.get("Resources", []):
+        size += len(resource.encode("utf-8"))
+    return size
+
+
+def build_entry(detail_type, detail, source, event_bus_name=None):
+    return {
+        "Source": source,
+        "DetailType": detail_type,
+        "Detail": dumps(detail),
+        "EventBusName": event_bus_name or os.environ.get("EVENT_BUS_NAME", "default"),
+    }
+
+
+def chunk_entries(entries):
+    """Agrupa entradas en llamadas de hasta 10 entradas y 256 KB, en orden."""
+    chunk, chunk_bytes = [], 0
+    for entry in entries:
+        size = entry_size(entry)
+        if chunk and (len(chunk) == PUT_EVENTS_MAX_ENTRIES or chunk_bytes + size > PUT_EVENTS_MAX_BYTES):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(entry)
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def put_event_entries(entries: list):
+    """
+    Envía entradas PutEvents ya armadas (un intento, llamadas de hasta 10 entradas).
+
+    Devuelve una lista paralela a `entries` con None si la entrada se publicó
+    o el código de error de EventBridge si falló.
+    """
+    results = []
+    for chunk in chunk_entries(entries):
+        if len(chunk) == 1 and entry_size(chunk[0]) > PUT_EVENTS_MAX_BYTES:
+            results.append("EntryTooLarge")
+            continue
+        try:
+            resp = events_client.put_events(Entries=chunk)
+        except Exception as e:
+            print(f"Error putting {len(chunk)} events: {str(e)}")
+            results.extend(["PutEventsError"] * len(chunk))
+            continue
+        # La respuesta trae una entrada por evento, en el mismo orden
+        for entry in resp.get("Entries", []):
+            results.append(entry.get("ErrorCode"))
+
+    return results
+
+
+class EventPublisher:
+    """
+    Buffer de eventos por invocación. Seguro entre hilos: los handlers que
+    procesan en un ThreadPoolExecutor comparten un publisher y hacen un solo flush.
+    """
+
+    def __init__(self, source, event_bus_name=None, max_attempts=EVENTS_MAX_ATTEMPTS,
+                 auto_flush=True):
+        self.source = source
+        self.event_bus_name = event_bus_name
+        self.max_attempts = max_attempts
+        # Con auto_flush se envía cada vez que hay 10 entradas en el buffer
+        self.auto_flush = auto_flush
+        self._buffer = []
+        self._failed = []
+        self._lock = threading.Lock()
+
+    def add(self, detail_type, detail, source=None):
+        """
+        Agrega un evento al buffer. Lanza ValueError si la entrada supera 256 KB
+        (EventBridge la rechazaría igual; así el error aparece donde se arma).
+        """
+        entry = build_entry(detail_type, detail, source or self.source, self.event_bus_name)
+        size = entry_size(entry)
+        if size > PUT_EVENTS_MAX_BYTES:
+            raise ValueError(f"Evento {detail_type} de {size} bytes supera el límite de 256 KB")
+        self.add_entry(entry)
+
+    def add_entry(self, entry):
+        with self._lock:
+            self._buffer.append(entry)
+            if not (self.auto_flush and len(self._buffer) >= PUT_EVENTS_MAX_ENTRIES):
+                return
+            pending, self._buffer = self._buffer, []
+
+        failed = self._failed_entries(pending, self._publish(pending))
+        if failed:
+            with self._lock:
+                self._failed.extend(failed)
+
+    def flush(self):
+        """
+        Envía lo que quede en el buffer. Devuelve las entradas que no se pudieron
+        publicar desde el último flush (cada una con su "ErrorCode").
+        """
+        with self._lock:
+            pending, self._buffer = self._buffer, []
+            failed, self._failed = self._failed, []
+        return failed + self._failed_entries(pending, self._publish(pending))
+
+    def send(self, entries):
+        """
+        Publica `entries` sin pasar por el buffer. Devuelve una lista paralela
+        con None o el código de error final de cada entrada.
+        """
+        errors = [None] * len(entries)
+        for i, error in self._publish(entries).items():
+            errors[i] = error
+        return errors
+
+    @staticmethod
+    def _failed_entries(entries, errors):
+        return [dict(entries[i], ErrorCode=error) for i, error in sorted(errors.items())]
+
+    def _publish(self, entries):
+        """Publica con reintentos; devuelve {índice: código de error} de las que fallaron."""
+        if not entries:
+            return {}
+
+        pending = list(range(len(entries)))
+        errors = {}
+        retried = 0
+        for attempt in range(self.max_attempts):
+            if attempt:
+                retried += len(pending)
+                # Backoff exponencial con jitter completo
+                time.sleep(random.uniform(0, min(EVENTS_MAX_DELAY, EVENTS_BASE_DELAY * (2 ** attempt))))
+
+            results = put_event_entries([entries[i] for i in pending])
+            retry = []
+            for i, error in zip(pending, results):
+                if not error:
+                    errors.pop(i, None)
+                    continue
+                errors[i] = error
+                if error not in NON_RETRYABLE_ERRORS:
+                    retry.append(i)
+            pending = retry
+            if not pending:
+                break
+
+        for i, error in sorted(errors.items()):
+            entry = entries[i]
+            print(f"Evento {entry.get('DetailType')} sin publicar ({error}): {entry.get('Detail')}")
+
+        emit_metrics(
+            {
+                "EventsPublished": len(entries) - len(errors),
+                "EventsRetried": retried,
+                "EventsFailed": len(errors),
+            },
+            dimensions={"source": self.source},
+        )
+        return errors
+
+
+# ---------------------------
+# Publicar eventos EB
+# ---------------------------
+def publish_order_event(detail_type: str, detail: dict, source: str = "orders.service"):
+    """
+    Envía un evento a EventBridge.
+    Usa el bus definido en EVENT_BUS_NAME (si no existe, usa default).
+    Lanza EventPublishError si la entrada no se pudo publicar tras los reintentos.
+    """
+    detail = dict(detail)  # copia defensiva
+    detail["event_time"] = datetime.now(timezone.utc).isoformat()
+
+    publisher = EventPublisher(source)
+    publisher.add(detail_type, detail)
+    failed = publisher.flush()
+    if failed:
+        raise EventPublishError(failed)
@@ -0,0 +1,58 @@
+"""
+Historial de pedidos como items separados en ORDER_HISTORY_TABLE.
+
+Cada cambio de estado (o evento recibido por Status) es un item propio:
+
+    order_key = "<tenant_id>#<order_id>"          (HASH)
+    event_key = "<timestamp ISO>#<sufijo único>"  (RANGE, orden cronológico)
+
+El item del pedido queda de tamaño fijo y el historial se lee con una sola
+query por order_key, solo cuando se pide.
+"""
+import os
+import uuid
+from datetime import datetime, timezone
+from . import aws
+from .keys import history_event_key, order_history_key
+
+SOURCE_WORKFLOW = "workflow"        # Orders + Fulfillment (INIT, COOKING, ..., CANCELLED)
+SOURCE_EVENTBRIDGE = "eventbridge"  # eventos registrados por el listener de Status
+
+
+def history_table_name():
+    return os.environ.get("ORDER_HISTORY_TABLE", "OrderHistory")
+
+
+def history_item(tenant_id, order_id, entry, source=SOURCE_WORKFLOW, event_id=None):
+    """
+    Item de historial a partir de una entrada (action/status/timestamp/...).
+    Con event_id (id del evento de EventBridge) el event_key es determinístico:
+    una redelivery del mismo evento cae en el mismo item.
+    """
+    timestamp = entry.get("timestamp") or datetime.now(timezone.utc).isoformat()
+    item = dict(entry)
+    item.update({
+        "order_key": order_history_key(tenant_id, order_id),
+        "event_key": history_event_key(timestamp, event_id or uuid.uuid4().hex[:12]),
+        "source": source,
+        "timestamp": timestamp,
+    })
+    return item
+
+
+def history_put(tenant_id, order_id, entry, source=SOURCE_WORKFLOW, event_id=None):
+    """
+    Acción Put de TransactWriteItems con la entrada de historial, para escribirla
+    en la misma transacción que el cambio de estado del pedido.
+
+    Con event_id el Put es condicional (attribute_not_exists): un evento repetido
+    cancela la transacción con ConditionalCheckFailed en esta acción.
+    """
+    item = history_item(tenant_id, order_id, entry, source, event_id)
+    put = {
+        "TableName": history_table_name(),
+        "Item": aws.to_dynamo_item(item),
+    }
+    if event_id:
+        put["ConditionExpression"] = "attribute_not_exists(event_key)"
+    return {"Put": put}
@@ -0,0 +1,64 @@
+import hashlib
+from .serialization import dumps
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": (
+        "Content-Type,X-Amz-Date,Authorization,X-Api-Key,"
+        "X-Amz-Security-Token,x-tenant-id,Idempotency-Key,If-None-Match"
+    ),
+    "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE,PATCH",
+    "Access-Control-Expose-Headers": "ETag,Idempotent-Replayed",
+}
+
+
+# ---------------------------
+# Respuestas API Gateway
+# ---------------------------
+def response(status, body, headers=None):
+    """
+    Respuesta lambda-proxy con CORS. El body puede traer Decimals de DynamoDB:
+    se serializan directamente, sin limpiarlos antes.
+    """
+    resp_headers = dict(CORS_HEADERS)
+    if headers:
+        resp_headers.update(headers)
+    return {
+        "statusCode": status,
+        "headers": resp_headers,
+        "body": dumps(body)
+    }
+
+
+# ---------------------------
+# GET condicional (ETag / If-None-Match)
+# ---------------------------
+def etag_for(*parts):
+    """ETag fuerte a partir de los valores que cambian con el recurso (ej. updated_at)."""
+    digest = hashlib.sha1("|".join("" if p is None else str(p) for p in parts).encode("utf-8"))
+    return f'"{digest.hexdigest()[:20]}"'
+
+
+def if_none_match(event):
+    """ETags del header If-None-Match (sin W/), o set() si no viene."""
+    for name, value in (event.get("headers") or {}).items():
+        if name.lower() == "if-none-match" and value:
+            return {
+                tag.strip().removeprefix("W/")
+                for tag in value.split(",")
+                if tag.strip()
+            }
+    return set()
+
+
+def etag_matches(event_etags, etag):
+    return bool(event_etags) and ("*" in event_etags or etag in event_etags)
+
+
+def not_modified(etag):
+    """304 sin body: el cliente reutiliza su copia."""
+    return {
+        "statusCode": 304,
+        "headers": dict(CORS_HEADERS, ETag=etag),
+        "body": "",
+    }
@@ -0,0 +1,156 @@
+"""
+Soporte de `Idempotency-Key` para endpoints POST/PATCH que los clientes reintentan.
+
+El primer request con una clave reserva el registro (put condicional, estado
+IN_PROGRESS), ejecuta el handler y guarda la respuesta. Los reintentos con la
+misma clave devuelven esa respuesta sin volver a ejecutar el handler, es decir,
+sin escribir en Orders ni publicar eventos.
+
+    from chinawok_common import idempotent
+
+    @idempotent("orders:create")
+    def lambda_handler(event, context):
+        ...
+
+Sin header, o sin IDEMPOTENCY_TABLE configurada, el handler se ejecuta normal.
+"""
+import functools
+import hashlib
+import json
+import os
+import time
+from . import aws
+from .http import response
+from .serialization import dumps
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_LOCK_SECONDS = 30
+
+STATUS_IN_PROGRESS = "IN_PROGRESS"
+STATUS_COMPLETED = "COMPLETED"
+
+
+def get_idempotency_key(event):
+    """Header Idempotency-Key (sin importar mayúsculas) o None."""
+    for name, value in (event.get("headers") or {}).items():
+        if name.lower() == IDEMPOTENCY_HEADER:
+            return (value or "").strip() or None
+    return None
+
+
+def _fingerprint(event):
+    raw = "\n".join([
+        event.get("httpMethod") or "",
+        event.get("path") or "",
+        event.get("body") or "",
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _lock_seconds(context):
+    # El lock dura lo que le queda a la invocación: si la Lambda muere a mitad,
+    # un reintento posterior puede tomar la clave de nuevo.
+    remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if callable(remaining):
+        return max(1, int(remaining() / 1000) + 1)
+    return DEFAULT_LOCK_SECONDS
+
+
+def _replay(item):
+    stored = json.loads(item["response"])
+    headers = dict(stored.get("headers") or {})
+    headers["Idempotent-Replayed"] = "true"
+    return {
+        "statusCode": stored["statusCode"],
+        "headers": headers,
+        "body": stored.get("body"),
+    }
+
+
+def idempotent(scope, error_field="message"):
+    """
+    Decora un lambda_handler de API Gateway.
+
+    La clave se guarda como "<scope>#<tenant_id>#<Idempotency-Key>", así la misma
+    clave no choca entre endpoints ni entre tenants. Se guardan las respuestas
+    < 500; ante un 5xx o una excepción se libera la clave para permitir el reintento.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            table_name = os.environ.get("IDEMPOTENCY_TABLE")
+            key = get_idempotency_key(event)
+            if not table_name or not key:
+                return handler(event, context)
+
+            if len(key) > MAX_KEY_LENGTH:
+                return response(400, {error_field: f"Idempotency-Key admite hasta {MAX_KEY_LENGTH} caracteres"})
+
+            tenant_id = (event.get("headers") or {}).get("x-tenant-id") or "-"
+            record_key = f"{scope}#{tenant_id}#{key}"
+            fingerprint = _fingerprint(event)
+            table = aws.table(table_name)
+            now = int(time.time())
+
+            # -------- 1) Reservar la clave (put condicional) ----------
+            # Se puede tomar si no existe, si ya expiró (TTL aún no la borró)
+            # o si quedó IN_PROGRESS de una invocación que no terminó.
+            try:
+                table.put_item(
+                    Item={
+                        "idempotency_key": record_key,
+                        "status": STATUS_IN_PROGRESS,
+                        "fingerprint": fingerprint,
+                        "lock_expires_at": now + _lock_seconds(context),
+                        "expires_at": now + int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+                    },
+                    ConditionExpression=(
+                        "attribute_not_exists(idempotency_key) OR expires_at < :now "
+                        "OR (#st = :in_progress AND lock_expires_at < :now)"
+                    ),
+                    ExpressionAttributeNames={"#st": "status"},
+                    ExpressionAttributeValues={":now": now, ":in_progress": STATUS_IN_PROGRESS},
+                )
+            except table.meta.client.exceptions.ConditionalCheckFailedException:
+                existing = table.get_item(
+                    Key={"idempotency_key": record_key}, ConsistentRead=True
+                ).get("Item")
+
+                if existing is None:
+                    # Expiró y TTL la borró entre el put y el get: el cliente puede reintentar
+                    return response(409, {error_field: "Hay un request en curso con esta Idempotency-Key"})
+                if existing.get("fingerprint") != fingerprint:
+                    return response(422, {error_field: "Idempotency-Key ya usada con otro request"})
+                if existing.get("status") == STATUS_COMPLETED:
+                    return _replay(existing)
+                return response(409, {error_field: "Hay un request en curso con esta Idempotency-Key"})
+
+            # -------- 2) Ejecutar y guardar la respuesta ----------
+            try:
+                result = handler(event, context)
+            except Exception:
+                table.delete_item(Key={"idempotency_key": record_key})
+                raise
+
+            if result.get("statusCode", 500) >= 500:
+                table.delete_item(Key={"idempotency_key": record_key})
+                return result
+
+            table.update_item(
+                Key={"idempotency_key": record_key},
+                UpdateExpression="SET #st = :completed, #resp = :resp REMOVE lock_expires_at",
+                ExpressionAttributeNames={"#st": "status", "#resp": "response"},
+                ExpressionAttributeValues={
+                    ":completed": STATUS_COMPLETED,
+                    ":resp": dumps({
+                        "statusCode": result["statusCode"],
+                        "headers": result.get("headers") or {},
+                        "body": result.get("body"),
+                    }),
+                },
+            )
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,26 @@
+# ---------------------------
+# Claves compuestas de los índices de la tabla de pedidos
+# ---------------------------
+def tenant_customer_key(tenant_id, customer_id):
+    """Clave de partición de TenantCustomerIndex: tenant_id#customer_id."""
+    return f"{tenant_id}#{customer_id}"
+
+
+def status_created_key(status, created_at):
+    """Clave de rango de StatusCreatedIndex: status#created_at."""
+    return f"{status}#{created_at}"
+
+
+def pending_step_key(pending_step, pending_updated_at):
+    """Clave de rango de PendingStepIndex (sparse): pending_step#pending_updated_at."""
+    return f"{pending_step}#{pending_updated_at}"
+
+
+def order_history_key(tenant_id, order_id):
+    """Clave de partición de OrderHistoryTable: tenant_id#order_id."""
+    return f"{tenant_id}#{order_id}"
+
+
+def history_event_key(timestamp, suffix):
+    """Clave de rango de OrderHistoryTable: timestamp#sufijo (id del evento o aleatorio)."""
+    return f"{timestamp}#{suffix}"
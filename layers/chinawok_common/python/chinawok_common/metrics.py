@@ -0,0 +1,44 @@
+"""
+Métricas de CloudWatch con Embedded Metric Format (EMF).
+
+Cada llamada imprime una línea JSON en el log de la Lambda; CloudWatch la
+convierte en métricas sin llamadas a PutMetricData (ni latencia extra).
+"""
+import json
+import os
+import time
+
+DEFAULT_NAMESPACE = "ChinaWok"
+
+
+def metrics_namespace():
+    return os.environ.get("METRICS_NAMESPACE", DEFAULT_NAMESPACE)
+
+
+def emit_metrics(metrics: dict, dimensions: dict = None, unit: str = "Count",
+                 units: dict = None, namespace: str = None):
+    """
+    Emite un registro EMF con los valores de `metrics` ({nombre: valor}).
+
+    dimensions: {nombre: valor} (ej. {"tenant_id": "LIMA_CENTRO", "step": "PACK"}).
+    units: unidad por métrica cuando no es `unit` (ej. {"OldestWaitMinutes": "None"}).
+    Devuelve el registro emitido.
+    """
+    dimensions = {k: str(v) for k, v in (dimensions or {}).items()}
+    units = units or {}
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": namespace or metrics_namespace(),
+                    "Dimensions": [sorted(dimensions)],
+                    "Metrics": [{"Name": name, "Unit": units.get(name, unit)} for name in metrics],
+                }
+            ],
+        },
+        **dimensions,
+        **metrics,
+    }
+    print(json.dumps(record))
+    return record
@@ -0,0 +1,48 @@
+import base64
+import json
+from .serialization import dumps
+
+# ---------------------------
+# Paginación con cursor opaco
+# ---------------------------
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def parse_limit(params, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    Lee `limit` de los query params y lo acota a [1, maximum].
+    Lanza ValueError si no es un entero.
+    """
+    raw = (params or {}).get("limit")
+    if raw in (None, ""):
+        return default
+    limit = int(raw)
+    return max(1, min(limit, maximum))
+
+
+def encode_cursor(last_evaluated_key):
+    """
+    Convierte el LastEvaluatedKey de DynamoDB en un token opaco (base64 url-safe).
+    Devuelve None cuando no hay más páginas.
+    """
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(dumps(last_evaluated_key).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token):
+    """
+    Inverso de encode_cursor: devuelve el ExclusiveStartKey o None.
+    Lanza ValueError si el token no es válido.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token.encode("ascii"))
+        key = json.loads(raw)
+    except (ValueError, UnicodeEncodeError) as e:
+        raise ValueError("cursor inválido") from e
+    if not isinstance(key, dict):
+        raise ValueError("cursor inválido")
+    return key
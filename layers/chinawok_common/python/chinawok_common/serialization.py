@@ -0,0 +1,41 @@
+"""
+Serialización JSON de una sola pasada.
+
+Los Decimal que devuelve DynamoDB se convierten durante el encode (int si son
+enteros, float si no), sin recorrer antes el payload con clean_decimals.
+Usa orjson si está instalado en el layer; si no, la librería estándar.
+"""
+import json
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del build del layer
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        # si es número entero, devuelve int; si no, float
+        return int(obj) if obj % 1 == 0 else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+_encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> str:
+        """Serializa `obj` a JSON (str) convirtiendo Decimals en la misma pasada."""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS).decode("utf-8")
+
+    BACKEND = "orjson"
+else:
+    def dumps(obj) -> str:
+        """Serializa `obj` a JSON (str) convirtiendo Decimals en la misma pasada."""
+        return _encoder.encode(obj)
+
+    BACKEND = "json"
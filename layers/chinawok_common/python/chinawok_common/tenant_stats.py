@@ -0,0 +1,190 @@
+"""
+Agregados del dashboard por tenant en TENANT_STATS_TABLE.
+
+El listener de Status aplica cada evento de estado con ADD atómicos sobre dos items:
+
+    tenant_id = "<tenant>", stats_key = "ALL"               (histórico + pedidos por estado)
+    tenant_id = "<tenant>", stats_key = "DAY#<YYYY-MM-DD>"  (movimientos del día del evento)
+
+Contadores (todos los items):
+    recibidos, entregados, cancelados, ventas,
+    created_epoch_sum          suma de created_at (epoch s) de los pedidos recibidos
+    entrega_segundos_total     suma de (entrega - creación) de los entregados
+Solo en ALL:
+    estado_<STATUS>            pedidos actualmente en cada estado (+1 al entrar, -1 al salir)
+    primer_pedido_epoch        created_at del primer pedido registrado
+    tenant_registry = "TENANT" clave del GSI sparse TenantIndex: lista de tenants sin scan
+
+El dashboard responde sus estadísticas con un get_item, sin leer pedidos.
+"""
+import os
+from datetime import datetime, timezone
+from decimal import Decimal
+from . import aws
+
+STATS_KEY_ALL = "ALL"
+
+# Partición del GSI TenantIndex (tenant_registry HASH, tenant_id RANGE): solo la
+# tienen los items ALL, un item por tenant
+TENANT_REGISTRY_KEY = "TENANT"
+
+# Tipo de evento -> (estado que deja, estado al que entra).
+# PedidoCancelado sale de un estado variable: lo indica quien aplica el evento.
+STATUS_EVENTS = {
+    "PedidoRecibido": (None, "PENDIENTE"),
+    "CocinaIniciada": ("PENDIENTE", "COCINANDO"),
+    "EmpaqueIniciado": ("COCINANDO", "EMPACANDO"),
+    "RepartoIniciado": ("EMPACANDO", "EN_REPARTO"),
+    "PedidoEntregado": ("EN_REPARTO", "ENTREGADO"),
+    "PedidoCancelado": (None, "CANCELADO"),
+}
+
+# Contador de flujo por evento (se suma en ALL y en el item del día)
+FLOW_COUNTERS = {
+    "PedidoRecibido": "recibidos",
+    "PedidoEntregado": "entregados",
+    "PedidoCancelado": "cancelados",
+}
+
+
+def tenant_stats_table_name():
+    return os.environ.get("TENANT_STATS_TABLE", "TenantStats")
+
+
+def stats_day_key(day):
+    return f"DAY#{day}"
+
+
+def _epoch(iso_ts):
+    if not iso_ts:
+        return None
+    try:
+        return int(datetime.fromisoformat(str(iso_ts).replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return None
+
+
+def stats_counters(event_type, detail, previous_status=None):
+    """
+    Deltas de un evento: ({atributo: delta} para ADD, {atributo: delta} solo para ALL).
+    Devuelve (None, None) si el evento no mueve ningún contador.
+    """
+    if event_type not in STATUS_EVENTS:
+        return None, None
+
+    left, entered = STATUS_EVENTS[event_type]
+    if event_type == "PedidoCancelado":
+        left = previous_status
+
+    counters = {}
+    if event_type in FLOW_COUNTERS:
+        counters[FLOW_COUNTERS[event_type]] = 1
+
+    created_epoch = _epoch(detail.get("created_at"))
+    if event_type == "PedidoRecibido":
+        if detail.get("total") is not None:
+            counters["ventas"] = Decimal(str(detail["total"]))
+        if created_epoch is not None:
+            counters["created_epoch_sum"] = created_epoch
+    elif event_type == "PedidoEntregado":
+        delivered_epoch = _epoch(detail.get("timestamp") or detail.get("event_time"))
+        if created_epoch is not None and delivered_epoch is not None:
+            counters["entrega_segundos_total"] = max(delivered_epoch - created_epoch, 0)
+
+    status_counters = {f"estado_{entered}": 1}
+    if left and left != entered:
+        status_counters[f"estado_{left}"] = -1
+
+    return counters, status_counters
+
+
+def _update_action(tenant_id, stats_key, counters, now, set_first_epoch=None):
+    names, values, adds = {}, {":now": now}, []
+    for i, (attr, delta) in enumerate(sorted(counters.items())):
+        names[f"#c{i}"] = attr
+        values[f":c{i}"] = delta
+        adds.append(f"#c{i} :c{i}")
+
+    update_expression = "SET updated_at = :now"
+    if stats_key == STATS_KEY_ALL:
+        update_expression += ", tenant_registry = :registry"
+        values[":registry"] = TENANT_REGISTRY_KEY
+    if set_first_epoch is not None:
+        update_expression += ", primer_pedido_epoch = if_not_exists(primer_pedido_epoch, :first)"
+        values[":first"] = set_first_epoch
+    if adds:
+        update_expression += " ADD " + ", ".join(adds)
+
+    update = {
+        "TableName": tenant_stats_table_name(),
+        "Key": aws.to_dynamo_item({"tenant_id": tenant_id, "stats_key": stats_key}),
+        "UpdateExpression": update_expression,
+        "ExpressionAttributeValues": aws.to_dynamo_item(values),
+    }
+    if names:
+        update["ExpressionAttributeNames"] = names
+    return {"Update": update}
+
+
+def stats_update_actions(tenant_id, event_type, detail, previous_status=None, now=None):
+    """
+    Acciones Update de TransactWriteItems (item ALL + item del día) para un evento,
+    o [] si el evento no afecta los agregados.
+    """
+    return stats_batch_update_actions(tenant_id, [(event_type, detail, previous_status)], now)
+
+
+def stats_batch_update_actions(tenant_id, events, now=None):
+    """
+    Como stats_update_actions para varios eventos (event_type, detail, previous_status)
+    del mismo tenant: los deltas se suman y sale un solo Update por item (ALL y
+    cada día), en vez de uno por evento.
+    """
+    now = now or datetime.now(timezone.utc).isoformat()
+    all_counters, day_counters, first_epoch = {}, {}, None
+
+    for event_type, detail, previous_status in events:
+        counters, status_counters = stats_counters(event_type, detail, previous_status)
+        if counters is None:
+            continue
+        # Día del evento (UTC), no del procesamiento: un reintento tardío cae en su día
+        day = str(detail.get("timestamp") or detail.get("event_time") or now)[:10]
+        for attr, delta in {**counters, **status_counters}.items():
+            all_counters[attr] = all_counters.get(attr, 0) + delta
+        if counters:
+            day_item = day_counters.setdefault(day, {})
+            for attr, delta in counters.items():
+                day_item[attr] = day_item.get(attr, 0) + delta
+        if "created_epoch_sum" in counters:
+            epoch = counters["created_epoch_sum"]
+            first_epoch = epoch if first_epoch is None else min(first_epoch, epoch)
+
+    # Un pedido que entra y sale de un estado en el mismo lote deja delta 0
+    all_counters = {attr: delta for attr, delta in all_counters.items() if delta}
+    actions = []
+    if all_counters or first_epoch is not None:
+        actions.append(_update_action(tenant_id, STATS_KEY_ALL, all_counters, now, first_epoch))
+    for day, counters in sorted(day_counters.items()):
+        actions.append(_update_action(tenant_id, stats_day_key(day), counters, now))
+    return actions
+
+
+def registered_tenants(table=None):
+    """
+    tenant_id de todos los tenants con agregados: query paginada a TenantIndex
+    (una partición, un item por tenant), sin scan.
+    """
+    table = table or aws.table(tenant_stats_table_name())
+    tenants = []
+    query_kwargs = {
+        "IndexName": "TenantIndex",
+        "KeyConditionExpression": "tenant_registry = :registry",
+        "ExpressionAttributeValues": {":registry": TENANT_REGISTRY_KEY},
+        "ProjectionExpression": "tenant_id",
+    }
+    while True:
+        resp = table.query(**query_kwargs)
+        tenants.extend(item["tenant_id"] for item in resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp:
+            return tenants
+        query_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
@@ -0,0 +1,133 @@
+# AdvanceOrderStep.py (estado + historial + token pendiente en una sola escritura por paso)
+from datetime import datetime, timezone
+from utils import OrderCancelledError, TransitionRejected
+from workflow import ACTION_CONFIG, ACTION_EXPECTED_STEP, DynamoDBBackend, history_entry_for, status_event_detail
+
+backend = DynamoDBBackend()
+
+
+def lambda_handler(event, context):
+    """
+    Invocada por Step Functions al llegar a cada paso del flujo.
+
+    Con waitForTaskToken (pasos que esperan al staff):
+    {
+      "action": "COOKING",
+      "taskToken": "...",
+      "step": "PACK",          # paso humano que queda pendiente
+      "payload": {"order_id": "...", "tenant_id": "...", ...}
+    }
+
+    Sin token (último paso): {"action": "DELIVERED", "payload": {...}}
+    """
+    return advance_order(
+        event["action"],
+        event["payload"],
+        task_token=event.get("taskToken"),
+        next_step=event.get("step"),
+    )
+
+
+def advance_order(action, payload, task_token=None, next_step=None):
+    """
+    Cambia el estado del pedido, guarda su entrada de historial y, si el paso
+    espera al staff, deja el token pendiente: todo en un solo TransactWriteItems
+    (Update del pedido + Put en OrderHistoryTable). Luego publica el evento de estado.
+    """
+    order_id = payload["order_id"]
+    tenant_id = payload.get("tenant_id")
+    customer_id = payload.get("customer_id")
+
+    if not tenant_id:
+        raise ValueError("tenant_id es requerido para AdvanceOrderStep")
+
+    if action not in ACTION_CONFIG:
+        raise ValueError(f"Acción inválida: {action}")
+
+    if bool(task_token) != bool(next_step):
+        raise ValueError("taskToken y step van juntos")
+
+    cfg = ACTION_CONFIG[action]
+    new_status = cfg["status"]
+
+    now = datetime.now(timezone.utc).isoformat()
+    created_at = payload.get("created_at") or get_created_at(tenant_id, order_id)
+
+    # La condición impide que un pedido cancelado vuelva a avanzar en el flujo y,
+    # como en WorkflowEngine, exige el paso pendiente que precede a la transición:
+    # una reinvocación del mismo paso no la aplica dos veces
+    try:
+        backend.write_transition(
+            tenant_id, order_id,
+            new_status=new_status,
+            created_at=created_at,
+            history_entry=history_entry_for(
+                action, new_status, now, payload.get("staff_id"), payload.get("staff_name")
+            ),
+            now=now,
+            expected_step=ACTION_EXPECTED_STEP[action],
+            next_step=next_step,
+            task_token=task_token,
+        )
+    except TransitionRejected:
+        order = backend.get_order(tenant_id, order_id)
+        if order is None or order.get("status") == "CANCELADO":
+            raise OrderCancelledError(f"Pedido {tenant_id}/{order_id} cancelado o inexistente")
+        if order.get("status") != new_status or order.get("pending_step") != next_step:
+            raise
+        # Reinvocación de un paso ya aplicado: sin segunda escritura ni segundo evento
+        if task_token:
+            refresh_task_token(tenant_id, order_id, new_status, next_step, task_token)
+        return {
+            "order_id": order_id,
+            "tenant_id": tenant_id,
+            "status": new_status,
+            "created_at": created_at,
+            "pending_step": next_step,
+            "ts": now,
+        }
+
+    # Publica evento a EventBridge para Status/Dashboard (único lugar que emite
+    # los cambios de estado del flujo)
+    # Si el evento no sale tras los reintentos queda en logs y en EventsFailed;
+    # no se falla el paso porque el cambio de estado ya está escrito.
+    backend.publish(
+        cfg["event_type"],
+        status_event_detail(order_id, tenant_id, new_status, now, customer_id, created_at),
+    )
+    backend.flush()
+
+    return {
+        "order_id": order_id,
+        "tenant_id": tenant_id,
+        "status": new_status,
+        "created_at": created_at,
+        "pending_step": next_step,
+        "ts": now,
+    }
+
+
+def refresh_task_token(tenant_id, order_id, status, step, task_token):
+    """
+    Guarda el token de la reinvocación (Step Functions espera ese): solo si el
+    pedido sigue en el mismo estado y paso pendiente.
+    """
+    try:
+        backend.table.update_item(
+            Key={"tenant_id": tenant_id, "order_id": order_id},
+            UpdateExpression="SET pending_task_token = :token",
+            ConditionExpression="#st = :st AND pending_step = :step",
+            ExpressionAttributeNames={"#st": "status"},
+            ExpressionAttributeValues={":token": task_token, ":st": status, ":step": step},
+        )
+    except backend.table.meta.client.exceptions.ConditionalCheckFailedException:
+        raise TransitionRejected(f"Pedido {tenant_id}/{order_id}: cambió durante la reinvocación de {step}")
+
+
+def get_created_at(tenant_id, order_id):
+    """Lee solo created_at del pedido (para ejecuciones iniciadas sin ese dato)."""
+    res = backend.table.get_item(
+        Key={"tenant_id": tenant_id, "order_id": order_id},
+        ProjectionExpression="created_at",
+    )
+    return res.get("Item", {}).get("created_at", "")
@@ -0,0 +1,65 @@
+# CancelFulfillmentExecution.py
+import os
+from botocore.exceptions import ClientError
+from chinawok_common import aws
+stepfunctions = aws.lazy_client("stepfunctions")
+
+table = aws.lazy_table(os.environ["ORDERS_TABLE"])
+
+
+def lambda_handler(event, context):
+    """
+    EventBridge -> PedidoCancelado
+
+    Detiene la ejecución de Step Functions del pedido para que no quede esperando
+    su waitForTaskToken (CancelOrder ya limpió pending_task_token/pending_step).
+
+    event["detail"] esperado:
+    {
+      "order_id": "abc-123",
+      "tenant_id": "LIMA_CENTRO",
+      "reason": "...",
+      "cancelled_by": "..."
+    }
+
+    Es un target de EventBridge: un error inesperado se lanza para que lo vean los
+    reintentos asíncronos y el destino de fallos (CancelFulfillmentDLQ). Una
+    ejecución inexistente o ya terminada cuenta como detenida.
+    """
+    detail = event.get("detail", {})
+    order_id = detail["order_id"]
+    tenant_id = detail["tenant_id"]
+
+    res = table.get_item(
+        Key={"tenant_id": tenant_id, "order_id": order_id},
+        ProjectionExpression="step_function_arn",
+    )
+    execution_arn = res.get("Item", {}).get("step_function_arn")
+
+    # Sin ARN: el fulfillment aún no arrancó; StartFulfillmentExecution lo detiene al ver CANCELADO
+    if not execution_arn:
+        print(f"Pedido {tenant_id}/{order_id}: sin ejecución que detener")
+        return {"order_id": order_id, "stopped": False}
+
+    try:
+        stepfunctions.stop_execution(
+            executionArn=execution_arn,
+            error="PedidoCancelado",
+            cause=(detail.get("reason") or "Pedido cancelado")[:32768],
+        )
+    except stepfunctions.exceptions.ExecutionDoesNotExist:
+        print(f"Ejecución {execution_arn} no existe")
+    except ClientError:
+        # Ya terminada (entregada, fallida o detenida por otra vía): nada que detener
+        if execution_status(execution_arn) == "RUNNING":
+            raise
+        print(f"Ejecución {execution_arn} ya no estaba en curso")
+
+    return {"order_id": order_id, "execution_arn": execution_arn, "stopped": True}
+
+
+def execution_status(execution_arn):
+    try:
+        return stepfunctions.describe_execution(executionArn=execution_arn)["status"]
+    except stepfunctions.exceptions.ExecutionDoesNotExist:
+        return None
@@ -0,0 +1,250 @@
+# SlaWatchdog.py: detecta pedidos detenidos en un paso humano más allá de su SLA
+import os
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from boto3.dynamodb.conditions import Key
+from chinawok_common import EventPublisher, aws, dumps, emit_metrics, registered_tenants
+from workflow import STEP_TRANSITIONS
+
+ORDERS_TABLE = os.environ["ORDERS_TABLE"]
+EVENT_BUS_NAME = os.environ.get("EVENT_BUS_NAME", "default")
+SLA_CONFIG_PATH = os.environ.get(
+    "SLA_CONFIG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sla_config.json")
+)
+# Lecturas acotadas: como máximo estos pedidos atrasados por tenant y paso en cada corrida
+SLA_MAX_ORDERS_PER_STEP = int(os.environ.get("SLA_MAX_ORDERS_PER_STEP", "200"))
+SLA_MAX_WORKERS = int(os.environ.get("SLA_MAX_WORKERS", "8"))
+
+table = aws.lazy_table(ORDERS_TABLE)
+publisher = EventPublisher("fulfillment.service", EVENT_BUS_NAME)
+
+# Pasos humanos que vigila el watchdog (los que deja pendientes el flujo)
+SLA_STEPS = list(STEP_TRANSITIONS)
+
+
+def lambda_handler(event, context):
+    """
+    Programada (EventBridge Scheduler, cada minuto).
+
+    Los tenants salen del registro de TenantStats (query paginada al GSI TenantIndex,
+    un item por tenant) más los de sla_config.json. Por cada tenant y paso humano
+    consulta PendingStepIndex
+    (tenant_id + pending_key = "<paso>#<pending_updated_at>") con un rango que solo
+    incluye a los pedidos que esperan ese paso desde antes del umbral: no hay scan
+    y los pedidos al día no se leen.
+
+    Cada pedido atrasado se avisa una sola vez por paso (sla_alert_key = pending_key):
+    se publica PedidoRetrasado en lotes de 10 y se emiten contadores por tenant/paso.
+    """
+    return run_watchdog(dry_run=bool((event or {}).get("dry_run")))
+
+
+def load_sla_config(path=SLA_CONFIG_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def thresholds_for(config, tenant_id):
+    """Minutos por paso para un tenant: default_minutes + overrides del tenant."""
+    thresholds = dict(config.get("default_minutes", {}))
+    thresholds.update(config.get("tenants", {}).get(tenant_id) or {})
+    return {step: thresholds[step] for step in SLA_STEPS if step in thresholds}
+
+
+def run_watchdog(dry_run=False, now=None):
+    config = load_sla_config()
+    now = now or datetime.now(timezone.utc)
+
+    # default_minutes aplica a todo tenant registrado en TenantStats (todo tenant con
+    # pedidos tiene su item ALL); sla_config.json solo agrega overrides (y sus tenants
+    # se vigilan aunque aún no tengan pedidos, para que sus métricas no tengan huecos)
+    tenants = set(registered_tenants()) | set(config.get("tenants", {}))
+    checks = [
+        (tenant_id, step, minutes)
+        for tenant_id in sorted(tenants)
+        for step, minutes in thresholds_for(config, tenant_id).items()
+    ]
+    if not checks:
+        return {"checked": 0, "late": 0, "alerted": 0, "counters": []}
+
+    with ThreadPoolExecutor(max_workers=min(SLA_MAX_WORKERS, len(checks))) as pool:
+        results = list(pool.map(lambda c: check_step(*c, now=now, dry_run=dry_run), checks))
+
+    # Un solo envío para todos los avisos nuevos (PutEvents de a 10)
+    alerts = [alert for result in results for alert in result.pop("alerts")]
+    failed = publish_alerts(alerts, dry_run)
+
+    for result in results:
+        emit_metrics(
+            {
+                "LateOrders": result["late"],
+                "NewlyLateOrders": result["alerted"],
+                "OldestWaitMinutes": result["oldest_wait_minutes"],
+            },
+            dimensions={"tenant_id": result["tenant_id"], "step": result["step"]},
+            units={"OldestWaitMinutes": "None"},
+        )
+
+    summary = {
+        "checked": len(checks),
+        "late": sum(r["late"] for r in results),
+        "alerted": len(alerts) - len(failed),
+        "failed": len(failed),
+        "counters": results,
+    }
+    print(f"SLA watchdog: {summary['late']} pedidos atrasados, {summary['alerted']} avisos nuevos")
+    return summary
+
+
+def check_step(tenant_id, step, minutes, now, dry_run=False):
+    """
+    Pedidos del tenant que esperan `step` desde hace más de `minutes`.
+
+    Se leen del más reciente al más antiguo: los que acaban de pasar el umbral
+    (los que aún no se avisaron) vienen primero, y la lectura se corta en
+    SLA_MAX_ORDERS_PER_STEP aunque haya pedidos atascados desde hace horas.
+    """
+    cutoff = (now - timedelta(minutes=minutes)).isoformat()
+    key_range = Key("tenant_id").eq(tenant_id) & Key("pending_key").between(f"{step}#", f"{step}#{cutoff}")
+
+    late, alerts = [], []
+    query_kwargs = {
+        "IndexName": "PendingStepIndex",
+        "KeyConditionExpression": key_range,
+        "ScanIndexForward": False,
+    }
+    truncated = False
+    while True:
+        query_kwargs["Limit"] = SLA_MAX_ORDERS_PER_STEP - len(late)
+        resp = table.query(**query_kwargs)
+        late.extend(resp.get("Items", []))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        if len(late) >= SLA_MAX_ORDERS_PER_STEP:
+            truncated = True
+            break
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+    for order in late:
+        if order.get("sla_alert_key") == order["pending_key"]:
+            continue  # ya avisado en una corrida anterior
+        if dry_run or mark_alerted(tenant_id, order["order_id"], order["pending_key"]):
+            alerts.append({
+                "tenant_id": tenant_id,
+                "order_id": order["order_id"],
+                "pending_key": order["pending_key"],
+                "entry": alert_entry(order, tenant_id, step, minutes, now),
+            })
+
+    # El más antiguo queda fuera de la página si hubo corte: una lectura de 1 item
+    oldest = late[-1] if late else None
+    if truncated:
+        resp = table.query(
+            IndexName="PendingStepIndex",
+            KeyConditionExpression=key_range,
+            ScanIndexForward=True,
+            Limit=1,
+        )
+        oldest = (resp.get("Items") or [oldest])[0]
+
+    return {
+        "tenant_id": tenant_id,
+        "step": step,
+        "threshold_minutes": minutes,
+        "late": len(late),
+        "truncated": truncated,
+        "alerted": len(alerts),
+        "oldest_wait_minutes": wait_minutes(oldest.get("pending_updated_at"), now) if oldest else 0,
+        "alerts": alerts,
+    }
+
+
+def mark_alerted(tenant_id, order_id, pending_key):
+    """
+    Marca el aviso del paso actual. La condición descarta pedidos que avanzaron
+    después de la query y evita avisos duplicados si dos corridas se solapan.
+    """
+    try:
+        table.update_item(
+            Key={"tenant_id": tenant_id, "order_id": order_id},
+            ConditionExpression=(
+                "pending_key = :pk AND "
+                "(attribute_not_exists(sla_alert_key) OR sla_alert_key <> :pk)"
+            ),
+            UpdateExpression="SET sla_alert_key = :pk",
+            ExpressionAttributeValues={":pk": pending_key},
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def unmark_alerted(tenant_id, order_id, pending_key):
+    """Deshace la marca de un aviso que no se pudo publicar (se reintenta en la próxima corrida)."""
+    try:
+        table.update_item(
+            Key={"tenant_id": tenant_id, "order_id": order_id},
+            ConditionExpression="sla_alert_key = :pk",
+            UpdateExpression="REMOVE sla_alert_key",
+            ExpressionAttributeValues={":pk": pending_key},
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+
+
+def alert_entry(order, tenant_id, step, minutes, now):
+    detail = {
+        "order_id": order["order_id"],
+        "tenant_id": tenant_id,
+        "customer_id": order.get("customer_id"),
+        "pending_step": step,
+        "waiting_since": order.get("pending_updated_at"),
+        "waiting_minutes": wait_minutes(order.get("pending_updated_at"), now),
+        "threshold_minutes": minutes,
+        "timestamp": now.isoformat(),
+    }
+    return {
+        "Source": "fulfillment.service",
+        "DetailType": "PedidoRetrasado",
+        "Detail": dumps(detail),
+        "EventBusName": EVENT_BUS_NAME,
+    }
+
+
+def publish_alerts(alerts, dry_run=False):
+    """
+    Publica los avisos (lotes de 10, reintentando solo las entradas fallidas);
+    devuelve los que igual fallaron, ya desmarcados.
+    """
+    if dry_run:
+        for alert in alerts:
+            print(f"[dry-run] PedidoRetrasado {alert['entry']['Detail']}")
+        return []
+
+    errors = publisher.send([alert["entry"] for alert in alerts])
+    failed = [alert for alert, error in zip(alerts, errors) if error]
+    for alert in failed:
+        unmark_alerted(alert["tenant_id"], alert["order_id"], alert["pending_key"])
+    if failed:
+        print(f"SLA watchdog: {len(failed)} avisos sin publicar, se reintentan en la próxima corrida")
+    return failed
+
+
+def wait_minutes(iso_ts, now):
+    if not iso_ts:
+        return 0
+    try:
+        since = datetime.fromisoformat(iso_ts)
+    except ValueError:
+        return 0
+    return int((now - since).total_seconds() // 60)
+
+
+if __name__ == "__main__":
+    # Corrida local, ej. contra DynamoDB Local:
+    #   AWS_ENDPOINT_URL_DYNAMODB=http://localhost:8000 ORDERS_TABLE=... python SlaWatchdog.py --dry-run
+    result = run_watchdog(dry_run="--dry-run" in sys.argv[1:])
+    print(json.dumps(result, indent=2, default=str))
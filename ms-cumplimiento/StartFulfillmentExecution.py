@@ -1,56 +1,144 @@
-# StartFulfillmentExecution.py
-import os
-import json
-import boto3
-from datetime import datetime, timezone
-from utils import response
-stepfunctions = boto3.client("stepfunctions")
-dynamodb = boto3.resource("dynamodb")
-
-ORDERS_TABLE = os.environ["ORDERS_TABLE"]
-STATE_MACHINE_ARN = os.environ["FULFILLMENT_STATE_MACHINE_ARN"]
-
-table = dynamodb.Table(ORDERS_TABLE)
-
-
-def lambda_handler(event, context):
-    """
-    EventBridge -> PedidoRecibido
-
-    event["detail"] esperado:
-    {
-      "order_id": "abc-123",
-      "tenant_id": "LIMA_CENTRO",
-      "customer_id": "...",
-      "total": 100.0,
-      ...
-    }
-    """
-    detail = event.get("detail", {})
-    order_id = detail["order_id"]
-    tenant_id = detail["tenant_id"]
-
-    # Iniciar ejecución de Step Functions
-    input_data = {
-        "order_id": order_id,
-        "tenant_id": detail.get("tenant_id"),
-        "customer_id": detail.get("customer_id"),
-        "total": detail.get("total"),
-    }
-
-    response = stepfunctions.start_execution(
-        stateMachineArn=STATE_MACHINE_ARN,
-        input=json.dumps(input_data),
-        name=f"order-{order_id}-{int(datetime.now(timezone.utc).timestamp())}",
-    )
-
-    execution_arn = response["executionArn"]
-
-    # Guardar el ARN de la ejecución en la tabla de pedidos
-    table.update_item( 
-        Key={"tenant_id": tenant_id, "order_id": order_id},
-        UpdateExpression="SET step_function_arn = :arn",
-        ExpressionAttributeValues={":arn": execution_arn},
-    )
-
-    return response(200, {"message": "Fulfillment iniciado", "execution_arn": execution_arn})
+# StartFulfillmentExecution.py
+import os
+import re
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from chinawok_common import aws
+from utils import TransitionRejected
+import workflow
+stepfunctions = aws.lazy_client("stepfunctions")
+
+ORDERS_TABLE = os.environ["ORDERS_TABLE"]
+STATE_MACHINE_ARN = os.environ["FULFILLMENT_STATE_MACHINE_ARN"]
+START_MAX_WORKERS = int(os.environ.get("START_MAX_WORKERS", "8"))
+
+table = aws.lazy_table(ORDERS_TABLE)
+
+
+def lambda_handler(event, context):
+    """
+    SQS (FulfillmentStartQueue) <- EventBridge PedidoRecibido
+
+    Cada record trae en el body el evento de EventBridge; event["detail"] esperado:
+    {
+      "order_id": "abc-123",
+      "tenant_id": "LIMA_CENTRO",
+      "customer_id": "...",
+      "total": 100.0,
+      ...
+    }
+
+    Los pedidos del lote se inician en paralelo (pool acotado). Los que fallan
+    (throttling de StartExecution, etc.) se reportan en batchItemFailures: SQS los
+    vuelve a entregar y, tras varios intentos, los deja en la DLQ.
+    """
+    records = event.get("Records", [])
+    if not records:
+        return {"batchItemFailures": []}
+
+    with ThreadPoolExecutor(max_workers=min(START_MAX_WORKERS, len(records))) as pool:
+        outcomes = list(pool.map(process_record, records))
+
+    # Motor propio: los PedidoInicializado del lote salen juntos (PutEvents de a 10)
+    if workflow.uses_builtin_engine():
+        workflow.get_engine().flush()
+
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": record["messageId"]}
+            for record, ok in zip(records, outcomes)
+            if not ok
+        ]
+    }
+
+
+def process_record(record):
+    try:
+        detail = json.loads(record["body"]).get("detail", {})
+        start_fulfillment(detail)
+        return True
+    except Exception as e:
+        print(f"Error iniciando fulfillment (message {record.get('messageId')}): {str(e)}")
+        return False
+
+
+def execution_name(tenant_id, order_id):
+    """
+    Nombre determinístico por pedido: una redelivery del mismo PedidoRecibido
+    choca con la ejecución existente en vez de crear otra.
+
+    Step Functions acepta 80 caracteres: el prefijo legible se recorta y el hash de
+    tenant_id#order_id (sin recortar) hace que dos pedidos nunca compartan nombre.
+    """
+    digest = hashlib.sha256(f"{tenant_id}#{order_id}".encode("utf-8")).hexdigest()[:32]
+    prefix = re.sub(r"[^A-Za-z0-9_-]", "_", f"order-{tenant_id}-{order_id}")[:80 - len(digest) - 1]
+    return f"{prefix}-{digest}"
+
+
+def execution_arn_for(name):
+    return STATE_MACHINE_ARN.replace(":stateMachine:", ":execution:") + f":{name}"
+
+
+def start_fulfillment(detail):
+    order_id = detail["order_id"]
+    tenant_id = detail["tenant_id"]
+
+    input_data = {
+        "order_id": order_id,
+        "tenant_id": tenant_id,
+        "customer_id": detail.get("customer_id"),
+        "total": detail.get("total"),
+        "created_at": detail.get("created_at"),
+    }
+
+    # Motor propio (WORKFLOW_ENGINE=dynamodb): arrancar es una escritura condicional,
+    # una redelivery del evento se rechaza sin efectos
+    if workflow.uses_builtin_engine():
+        try:
+            workflow.get_engine().start(input_data)
+        except TransitionRejected:
+            print(f"Pedido {tenant_id}/{order_id}: fulfillment ya iniciado o pedido cancelado")
+        return
+
+    # Iniciar ejecución de Step Functions
+    name = execution_name(tenant_id, order_id)
+    try:
+        execution = stepfunctions.start_execution(
+            stateMachineArn=STATE_MACHINE_ARN,
+            input=json.dumps(input_data),
+            name=name,
+        )
+        execution_arn = execution["executionArn"]
+    except stepfunctions.exceptions.ExecutionAlreadyExists:
+        # Redelivery: la ejecución de este pedido ya existe
+        execution_arn = execution_arn_for(name)
+
+    # Guardar el ARN de la ejecución en la tabla de pedidos, solo si no hay otro
+    # Si el pedido se canceló antes de llegar aquí, CancelFulfillmentExecution no
+    # pudo ver este ARN: se detiene la ejecución recién creada.
+    try:
+        table.update_item(
+            Key={"tenant_id": tenant_id, "order_id": order_id},
+            ConditionExpression=(
+                "#st <> :cancelled AND "
+                "(attribute_not_exists(step_function_arn) OR step_function_arn = :arn)"
+            ),
+            UpdateExpression="SET step_function_arn = :arn",
+            ExpressionAttributeNames={"#st": "status"},
+            ExpressionAttributeValues={":arn": execution_arn, ":cancelled": "CANCELADO"},
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException as e:
+        current = e.response.get("Item") or {}
+        if not current or current.get("status", {}).get("S") == "CANCELADO":
+            stop_execution(execution_arn, "PedidoCancelado", "Pedido cancelado antes de iniciar el cumplimiento")
+        else:
+            stop_execution(execution_arn, "FulfillmentDuplicado", "El pedido ya tiene otra ejecución de fulfillment")
+
+
+def stop_execution(execution_arn, error, cause):
+    try:
+        stepfunctions.stop_execution(executionArn=execution_arn, error=error, cause=cause)
+    except stepfunctions.exceptions.ExecutionDoesNotExist:
+        print(f"Ejecución {execution_arn} no existe")
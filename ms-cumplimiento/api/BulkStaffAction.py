@@ -0,0 +1,65 @@
+# api/BulkStaffAction.py: acciones del staff sobre varios pedidos (POST /orders/bulk/{action})
+import os
+import json
+from chinawok_common import idempotent, response
+from staff_actions import STAFF_ACTIONS, run_bulk_staff_action
+
+MAX_BULK_ORDERS = int(os.environ.get("MAX_BULK_ORDERS", "50"))
+
+
+@idempotent("fulfillment:bulk-staff-action", error_field="error")
+def lambda_handler(event, context):
+    """
+    POST /orders/bulk/{action}   (action: assign-cook, mark-packed, assign-delivery, mark-delivered)
+
+    body:
+    {
+      "order_ids": ["...", "..."],
+      "staff_id": "...",
+      "staff_name": "..."
+    }
+
+    Devuelve un resultado por pedido (mismo orden que el request).
+    """
+    action = (event.get("pathParameters") or {}).get("action")
+    if action not in STAFF_ACTIONS:
+        return response(404, {"error": f"Acción desconocida: {action}",
+                              "valid_actions": sorted(STAFF_ACTIONS)})
+
+    tenant_id = (event.get("headers") or {}).get("x-tenant-id")
+    if not tenant_id:
+        return response(400, {"error": "x-tenant-id header requerido"})
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return response(400, {"error": "Invalid JSON body"})
+
+    order_ids = body.get("order_ids") if isinstance(body, dict) else None
+    if not isinstance(order_ids, list) or not order_ids or not all(
+        isinstance(o, str) and o for o in order_ids
+    ):
+        return response(400, {"error": "order_ids debe ser una lista no vacía de ids"})
+
+    # Un mismo pedido repetido se procesa una sola vez
+    order_ids = list(dict.fromkeys(order_ids))
+    if len(order_ids) > MAX_BULK_ORDERS:
+        return response(400, {"error": f"Se aceptan hasta {MAX_BULK_ORDERS} pedidos por request"})
+
+    staff_id = body.get("staff_id")
+    staff_name = body.get("staff_name")
+    if not staff_id or not staff_name:
+        return response(400, {"error": "staff_id y staff_name son requeridos"})
+
+    results = run_bulk_staff_action(tenant_id, order_ids, action, staff_id, staff_name)
+
+    resumed = sum(1 for r in results if r["success"])
+    status = 200 if resumed == len(results) else 207
+
+    return response(status, {
+        "success": resumed == len(results),
+        "message": f"{resumed} de {len(results)} pedidos reanudados",
+        "resumed": resumed,
+        "failed": len(results) - resumed,
+        "results": results
+    })
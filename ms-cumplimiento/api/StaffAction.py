@@ -0,0 +1,36 @@
+# api/StaffAction.py: endpoint único de acciones del staff (POST /orders/{order_id}/{action})
+import json
+from chinawok_common import idempotent, response
+from staff_actions import STAFF_ACTIONS, StaffActionError, run_staff_action
+
+
+@idempotent("fulfillment:staff-action", error_field="error")
+def lambda_handler(event, context):
+    path_params = event.get("pathParameters") or {}
+    order_id = path_params.get("order_id")
+    action = path_params.get("action")
+
+    if action not in STAFF_ACTIONS:
+        return response(404, {"error": f"Acción desconocida: {action}",
+                              "valid_actions": sorted(STAFF_ACTIONS)})
+
+    tenant_id = (event.get("headers") or {}).get("x-tenant-id")
+    if not tenant_id:
+        return response(400, {"error": "x-tenant-id header requerido"})
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return response(400, {"error": "Invalid JSON body"})
+
+    staff_id = body.get("staff_id")
+    staff_name = body.get("staff_name")
+    if not staff_id or not staff_name:
+        return response(400, {"error": "staff_id y staff_name son requeridos"})
+
+    try:
+        result = run_staff_action(tenant_id, order_id, action, staff_id, staff_name)
+    except StaffActionError as e:
+        return response(e.status, {"error": e.message})
+
+    return response(200, result)
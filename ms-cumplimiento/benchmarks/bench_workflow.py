@@ -0,0 +1,88 @@
+"""
+Ciclo de vida completo de pedidos con el motor propio sobre InMemoryBackend.
+
+Recorre PENDIENTE -> COCINANDO -> EMPACANDO -> EN_REPARTO -> ENTREGADO para N
+pedidos, verifica el estado final, el historial y los eventos emitidos, y que
+un paso repetido o un pedido cancelado se rechacen. Reporta transiciones/s del
+motor (sin red: mide el costo propio, no el de DynamoDB).
+
+Uso (desde ms-cumplimiento):
+
+    python benchmarks/bench_workflow.py [--orders 10000]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "layers", "chinawok_common", "python"))
+
+from utils import TransitionRejected  # noqa: E402
+from workflow import WORKFLOW, InMemoryBackend, WorkflowEngine  # noqa: E402
+
+STAFF_STEPS = [t["waits_for"] for t in WORKFLOW if t["waits_for"]]
+
+
+def new_order(tenant_id):
+    return {
+        "tenant_id": tenant_id,
+        "order_id": uuid.uuid4().hex,
+        "customer_id": "user123",
+        "status": "PENDIENTE",
+        "created_at": "2026-01-01T12:00:00+00:00",
+        "steps_completed": 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=10000)
+    args = parser.parse_args()
+
+    backend = InMemoryBackend()
+    engine = WorkflowEngine(backend)
+    orders = [new_order("LIMA_CENTRO") for _ in range(args.orders)]
+    for order in orders:
+        backend.put_order(order)
+
+    started = time.perf_counter()
+    for order in orders:
+        engine.start(order)
+        for step in STAFF_STEPS:
+            engine.complete_step(order["tenant_id"], order["order_id"], step, "STAFF#1", "Ana")
+    elapsed = time.perf_counter() - started
+
+    transitions = args.orders * len(WORKFLOW)
+    final = {backend.get_order(o["tenant_id"], o["order_id"])["status"] for o in orders}
+    assert final == {"ENTREGADO"}, final
+    assert len(backend.events) == transitions
+    assert len(backend.history) == transitions
+
+    # Un paso repetido (doble tap del staff / redelivery) no se aplica dos veces
+    sample = orders[0]
+    try:
+        engine.complete_step(sample["tenant_id"], sample["order_id"], "MARK_DELIVERED")
+        raise AssertionError("paso repetido aceptado")
+    except TransitionRejected:
+        pass
+
+    # Un pedido cancelado no avanza
+    cancelled = new_order("LIMA_CENTRO")
+    backend.put_order(cancelled)
+    engine.start(cancelled)
+    backend.orders[(cancelled["tenant_id"], cancelled["order_id"])]["status"] = "CANCELADO"
+    try:
+        engine.complete_step(cancelled["tenant_id"], cancelled["order_id"], "ASSIGN_COOK")
+        raise AssertionError("pedido cancelado avanzó")
+    except TransitionRejected:
+        pass
+
+    print(f"{args.orders} pedidos, {transitions} transiciones en {elapsed * 1000:.0f} ms "
+          f"({transitions / elapsed:,.0f} transiciones/s)")
+
+
+if __name__ == "__main__":
+    main()
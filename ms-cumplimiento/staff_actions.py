@@ -0,0 +1,245 @@
+# staff_actions.py: motor de acciones del staff (reanudan pasos waitForTaskToken)
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from chinawok_common import aws, pending_step_key
+from utils import TransitionRejected
+import workflow
+
+stepfunctions = aws.lazy_client("stepfunctions")
+ORDERS_TABLE = os.environ["ORDERS_TABLE"]
+# Cliente de bajo nivel (thread-safe): las acciones en bloque reclaman pedidos desde
+# un pool de hilos, y un Table/resource de boto3 no se comparte entre hilos
+dynamodb_client = aws.lazy_client("dynamodb")
+
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_ATTEMPTS = 4
+BULK_MAX_WORKERS = int(os.environ.get("BULK_MAX_WORKERS", "8"))
+
+# Acción de la URL (/orders/{order_id}/{action}) -> paso pendiente que reanuda.
+# Un paso humano nuevo en la máquina de estados solo necesita una entrada aquí.
+STAFF_ACTIONS = {
+    "assign-cook": {
+        "step": "ASSIGN_COOK",
+        "message": "Cook assigned and workflow resumed",
+        "not_waiting": "Order not waiting for cook assignment",
+    },
+    "mark-packed": {
+        "step": "PACK",
+        "message": "Order marked as packed, workflow resumed",
+        "not_waiting": "Order not waiting for PACK",
+    },
+    "assign-delivery": {
+        "step": "ASSIGN_DELIVERY",
+        "message": "Delivery assigned, workflow resumed",
+        "not_waiting": "Order not waiting for delivery assignment",
+    },
+    "mark-delivered": {
+        "step": "MARK_DELIVERED",
+        "message": "Order marked as delivered, workflow resumed",
+        "not_waiting": "Order not waiting for delivered",
+    },
+}
+
+# Errores de send_task_success que significan que el token ya no sirve
+DEAD_TOKEN_ERRORS = {"TaskTimedOut", "TaskDoesNotExist", "InvalidToken"}
+
+
+class StaffActionError(Exception):
+    """Error de una acción del staff con su código HTTP."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def claim_pending_step(tenant_id, order_id, step):
+    """
+    Toma el token pendiente de forma atómica: un solo update_item condicional
+    que lo borra y devuelve el item anterior (ALL_OLD). Si dos personas tocan
+    el mismo pedido, solo una gana la condición; la otra recibe 409.
+    """
+    try:
+        res = dynamodb_client.update_item(
+            TableName=ORDERS_TABLE,
+            Key=aws.to_dynamo_item({"tenant_id": tenant_id, "order_id": order_id}),
+            ConditionExpression="pending_step = :expected AND attribute_exists(pending_task_token)",
+            UpdateExpression="REMOVE pending_task_token, pending_step, pending_updated_at, pending_key",
+            ExpressionAttributeValues=aws.to_dynamo_item({":expected": step}),
+            ReturnValues="ALL_OLD",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException as e:
+        # Sin Item -> el pedido no existe; con Item -> no está esperando este paso
+        if not e.response.get("Item"):
+            raise StaffActionError(404, "Order not found")
+        return None
+    return aws.from_dynamo_item(res["Attributes"])
+
+
+def release_pending_step(tenant_id, order_id, claimed):
+    """Devuelve el token tomado (si nadie más escribió uno) para poder reintentar."""
+    pending_updated_at = claimed.get("pending_updated_at") or datetime.now(timezone.utc).isoformat()
+    try:
+        dynamodb_client.update_item(
+            TableName=ORDERS_TABLE,
+            Key=aws.to_dynamo_item({"tenant_id": tenant_id, "order_id": order_id}),
+            ConditionExpression="attribute_not_exists(pending_step) AND #st <> :cancelled",
+            UpdateExpression=(
+                "SET pending_task_token = :token, pending_step = :step, "
+                "pending_updated_at = :ts, pending_key = :pending_key"
+            ),
+            ExpressionAttributeNames={"#st": "status"},
+            ExpressionAttributeValues=aws.to_dynamo_item({
+                ":token": claimed["pending_task_token"],
+                ":step": claimed["pending_step"],
+                ":ts": pending_updated_at,
+                ":pending_key": pending_step_key(claimed["pending_step"], pending_updated_at),
+                ":cancelled": "CANCELADO",
+            }),
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException:
+        pass
+
+
+def run_staff_action(tenant_id, order_id, action, staff_id, staff_name, flush_events=True):
+    """
+    Ejecuta una acción del staff: toma el token y reanuda Step Functions.
+    Devuelve el body de la respuesta; lanza StaffActionError si no se puede.
+
+    flush_events=False deja el evento de estado (motor propio) en el buffer,
+    para que una acción en bloque los publique juntos.
+    """
+    cfg = STAFF_ACTIONS[action]
+    step = cfg["step"]
+
+    # Motor propio: completar el paso es la transición condicional misma
+    if workflow.uses_builtin_engine():
+        engine = workflow.get_engine()
+        try:
+            engine.complete_step(tenant_id, order_id, step, staff_id, staff_name)
+        except TransitionRejected as e:
+            if e.not_found:
+                raise StaffActionError(404, "Order not found")
+            raise StaffActionError(409, cfg["not_waiting"])
+        if flush_events:
+            engine.flush()
+        return {"message": cfg["message"], "order_id": order_id}
+
+    # -------- 1) Tomar el token (una sola llamada a DynamoDB) ----------
+    item = claim_pending_step(tenant_id, order_id, step)
+    if item is None:
+        raise StaffActionError(409, cfg["not_waiting"])
+
+    now = datetime.now(timezone.utc).isoformat()
+
+    output = {
+        "order_id": order_id,
+        "tenant_id": tenant_id,
+        "customer_id": item.get("customer_id"),
+        "total": item.get("total"),
+        "created_at": item.get("created_at"),
+        "staff_id": staff_id,
+        "staff_name": staff_name,
+        "step": step,
+        "timestamp": now,
+    }
+
+    # -------- 2) Reanudar el flujo ----------
+    try:
+        stepfunctions.send_task_success(
+            taskToken=item["pending_task_token"],
+            output=json.dumps(output, default=str),
+        )
+    except Exception as e:
+        code = getattr(e, "response", {}).get("Error", {}).get("Code")
+        if code in DEAD_TOKEN_ERRORS:
+            raise StaffActionError(409, f"Workflow task is no longer waiting ({code})")
+        # Error transitorio: se devuelve el token para que el staff pueda reintentar
+        release_pending_step(tenant_id, order_id, item)
+        raise
+
+    return {"message": cfg["message"], "order_id": order_id}
+
+
+# ---------------------------
+# Acciones en lote (POST /orders/bulk/{action})
+# ---------------------------
+def load_pending_steps(tenant_id, order_ids):
+    """
+    Lee pending_step de todos los pedidos con batch_get_item (100 claves por
+    llamada, reintentando UnprocessedKeys). Devuelve {order_id: pending_step};
+    los pedidos inexistentes no aparecen.
+    """
+    dynamodb = aws.resource("dynamodb")
+    found = {}
+
+    for start in range(0, len(order_ids), BATCH_GET_MAX_KEYS):
+        request = {
+            ORDERS_TABLE: {
+                "Keys": [
+                    {"tenant_id": tenant_id, "order_id": order_id}
+                    for order_id in order_ids[start:start + BATCH_GET_MAX_KEYS]
+                ],
+                "ProjectionExpression": "order_id, pending_step",
+            }
+        }
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(min(0.05 * (2 ** attempt), 1))
+            res = dynamodb.batch_get_item(RequestItems=request)
+            for item in res.get("Responses", {}).get(ORDERS_TABLE, []):
+                found[item["order_id"]] = item.get("pending_step")
+            request = res.get("UnprocessedKeys")
+            if not request:
+                break
+        else:
+            raise RuntimeError("batch_get_item dejó claves sin procesar")
+
+    return found
+
+
+def run_bulk_staff_action(tenant_id, order_ids, action, staff_id, staff_name):
+    """
+    Valida todos los pedidos con una lectura en lote y reanuda en paralelo
+    (pool acotado) los que están esperando el paso. Devuelve un resultado por
+    pedido, en el mismo orden que order_ids.
+    """
+    cfg = STAFF_ACTIONS[action]
+    pending = load_pending_steps(tenant_id, order_ids)
+
+    results = {}
+    ready = []
+    for order_id in order_ids:
+        if order_id not in pending:
+            results[order_id] = {"order_id": order_id, "success": False, "status": 404, "error": "Order not found"}
+        elif pending[order_id] != cfg["step"]:
+            results[order_id] = {"order_id": order_id, "success": False, "status": 409, "error": cfg["not_waiting"]}
+        else:
+            ready.append(order_id)
+
+    def resume(order_id):
+        # El claim sigue siendo condicional por pedido: la lectura en lote solo
+        # evita trabajo inútil, no reemplaza la garantía de no reanudar dos veces.
+        try:
+            body = run_staff_action(tenant_id, order_id, action, staff_id, staff_name, flush_events=False)
+            return {"order_id": order_id, "success": True, "status": 200, "message": body["message"]}
+        except StaffActionError as e:
+            return {"order_id": order_id, "success": False, "status": e.status, "error": e.message}
+        except Exception as e:
+            print(f"Error resuming {tenant_id}/{order_id}: {str(e)}")
+            return {"order_id": order_id, "success": False, "status": 500, "error": "Error resuming workflow"}
+
+    if ready:
+        with ThreadPoolExecutor(max_workers=min(BULK_MAX_WORKERS, len(ready))) as pool:
+            for result in pool.map(resume, ready):
+                results[result["order_id"]] = result
+
+        # Eventos de estado del lote en PutEvents de a 10 (motor propio)
+        if workflow.uses_builtin_engine():
+            workflow.get_engine().flush()
+
+    return [results[order_id] for order_id in order_ids]
@@ -0,0 +1,312 @@
+# workflow.py: grafo del flujo de pedidos + motor propio (alternativa a Step Functions)
+#
+# El flujo se declara una sola vez (WORKFLOW). Lo usan:
+#   - AdvanceOrderStep, cuando orquesta Step Functions (WORKFLOW_ENGINE=stepfunctions)
+#   - WorkflowEngine, que aplica cada transición con un update condicional y emite
+#     el evento, sin Step Functions (WORKFLOW_ENGINE=dynamodb)
+#   - InMemoryBackend, para probar y medir el ciclo completo en local (WORKFLOW_ENGINE=memory)
+import os
+from datetime import datetime, timezone
+from chinawok_common import (
+    EventPublisher, aws, from_dynamo_item, history_item, history_put, pending_step_key, status_created_key,
+    to_dynamo_item,
+)
+from utils import TransitionRejected
+
+# ---------------------------
+# Grafo del flujo único
+# ---------------------------
+# action: transición; waits_for: paso humano que queda pendiente al llegar.
+# Completar el paso humano de una transición dispara la siguiente.
+WORKFLOW = [
+    {"action": "INIT", "status": "PENDIENTE", "event_type": "PedidoInicializado", "waits_for": "ASSIGN_COOK"},
+    {"action": "COOKING", "status": "COCINANDO", "event_type": "CocinaIniciada", "waits_for": "PACK"},
+    {"action": "PACKING", "status": "EMPACANDO", "event_type": "EmpaqueIniciado", "waits_for": "ASSIGN_DELIVERY"},
+    {"action": "ON_DELIVERY", "status": "EN_REPARTO", "event_type": "RepartoIniciado", "waits_for": "MARK_DELIVERED"},
+    {"action": "DELIVERED", "status": "ENTREGADO", "event_type": "PedidoEntregado", "waits_for": None},
+]
+
+ACTION_CONFIG = {t["action"]: t for t in WORKFLOW}
+
+# paso humano -> transición que se aplica al completarlo
+STEP_TRANSITIONS = {
+    current["waits_for"]: following
+    for current, following in zip(WORKFLOW, WORKFLOW[1:])
+}
+
+# expected_step especial: el flujo aún no arrancó
+START = object()
+
+# transición -> paso humano que debe estar pendiente para aplicarla (Step Functions
+# invoca cada transición por action; INIT exige que el flujo no haya arrancado)
+ACTION_EXPECTED_STEP = {WORKFLOW[0]["action"]: START}
+ACTION_EXPECTED_STEP.update({
+    following["action"]: current["waits_for"]
+    for current, following in zip(WORKFLOW, WORKFLOW[1:])
+})
+
+ENGINE_STEPFUNCTIONS = "stepfunctions"
+ENGINE_DYNAMODB = "dynamodb"
+ENGINE_MEMORY = "memory"
+
+
+def engine_mode():
+    return os.environ.get("WORKFLOW_ENGINE", ENGINE_STEPFUNCTIONS)
+
+
+def uses_builtin_engine():
+    """True si el flujo lo aplica WorkflowEngine en vez de Step Functions."""
+    return engine_mode() != ENGINE_STEPFUNCTIONS
+
+
+def history_entry_for(action, status, now, staff_id=None, staff_name=None):
+    entry = {"action": action, "status": status, "timestamp": now}
+    # Si viene staff desde endpoint, lo agregamos al historial
+    if staff_id:
+        entry["staff_id"] = staff_id
+    if staff_name:
+        entry["staff_name"] = staff_name
+    return entry
+
+
+def status_event_detail(order_id, tenant_id, status, now, customer_id=None, created_at=None):
+    detail = {
+        "order_id": order_id,
+        "tenant_id": tenant_id,
+        "status": status,
+        "timestamp": now,
+    }
+    if customer_id:
+        detail["customer_id"] = customer_id
+    # Status lo usa para el tiempo de entrega en TenantStats
+    if created_at:
+        detail["created_at"] = created_at
+    return detail
+
+
+# ---------------------------
+# Backend DynamoDB
+# ---------------------------
+class DynamoDBBackend:
+    """Transiciones como TransactWriteItems condicional (pedido + historial)."""
+
+    def __init__(self):
+        self.orders_table_name = os.environ["ORDERS_TABLE"]
+        self.table = aws.lazy_table(self.orders_table_name)
+        self.dynamodb_client = aws.lazy_client("dynamodb")
+        # Los eventos de estado se acumulan y salen en PutEvents de a 10 (flush)
+        self.publisher = EventPublisher("fulfillment.service", os.environ["EVENT_BUS_NAME"])
+
+    def get_order(self, tenant_id, order_id):
+        # Con el cliente, no con self.table: las acciones en bloque llaman desde varios hilos
+        res = self.dynamodb_client.get_item(
+            TableName=self.orders_table_name,
+            Key=to_dynamo_item({"tenant_id": tenant_id, "order_id": order_id}),
+            ProjectionExpression="order_id, customer_id, created_at, #st, pending_step",
+            ExpressionAttributeNames={"#st": "status"},
+        )
+        item = res.get("Item")
+        return from_dynamo_item(item) if item is not None else None
+
+    def write_transition(self, tenant_id, order_id, new_status, created_at, history_entry,
+                         now, expected_step=None, next_step=None, task_token=None):
+        """
+        Un solo TransactWriteItems: Update del pedido + Put del historial.
+
+        expected_step: None -> solo exige que no esté cancelado (Step Functions);
+                       START -> el flujo no arrancó; un paso -> pending_step debe ser ese.
+        next_step: paso humano que queda pendiente (con task_token si lo orquesta Step Functions).
+        """
+        condition = "#st <> :cancelled"
+        values = {
+            ":st": new_status,
+            ":cancelled": "CANCELADO",
+            ":st_created": status_created_key(new_status, created_at),
+            ":ts": now,
+            ":one": 1,
+        }
+        if expected_step is START:
+            condition += " AND #st = :initial AND attribute_not_exists(pending_step)"
+            values[":initial"] = WORKFLOW[0]["status"]
+        elif expected_step:
+            condition += " AND pending_step = :expected"
+            values[":expected"] = expected_step
+
+        update_expression = "SET #st = :st, status_created = :st_created, updated_at = :ts"
+        if next_step:
+            # pending_key alimenta PendingStepIndex (cola de trabajo por estación)
+            update_expression += ", pending_step = :step, pending_updated_at = :ts, pending_key = :pending_key"
+            values[":step"] = next_step
+            values[":pending_key"] = pending_step_key(next_step, now)
+        if task_token:
+            update_expression += ", pending_task_token = :token"
+            values[":token"] = task_token
+        update_expression += " ADD steps_completed :one"
+        if expected_step and not next_step:
+            update_expression += " REMOVE pending_step, pending_updated_at, pending_key"
+
+        try:
+            self.dynamodb_client.transact_write_items(
+                TransactItems=[
+                    {
+                        "Update": {
+                            "TableName": self.orders_table_name,
+                            "Key": to_dynamo_item({"tenant_id": tenant_id, "order_id": order_id}),
+                            "ConditionExpression": condition,
+                            "UpdateExpression": update_expression,
+                            "ExpressionAttributeNames": {"#st": "status"},
+                            "ExpressionAttributeValues": to_dynamo_item(values),
+                        }
+                    },
+                    history_put(tenant_id, order_id, history_entry),
+                ]
+            )
+        except self.dynamodb_client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get("CancellationReasons") or []
+            if reasons and reasons[0].get("Code") == "ConditionalCheckFailed":
+                raise TransitionRejected(f"Pedido {tenant_id}/{order_id}: transición a {new_status} rechazada")
+            raise
+
+    def publish(self, event_type, detail):
+        self.publisher.add(event_type, detail)
+
+    def flush(self):
+        """Envía los eventos acumulados; devuelve los que no se pudieron publicar."""
+        return self.publisher.flush()
+
+
+# ---------------------------
+# Backend en memoria (tests / benchmarks locales)
+# ---------------------------
+class InMemoryBackend:
+    """Mismas condiciones que DynamoDBBackend sobre dicts; guarda historial y eventos."""
+
+    def __init__(self):
+        self.orders = {}
+        self.history = []
+        self.events = []
+
+    def put_order(self, order):
+        self.orders[(order["tenant_id"], order["order_id"])] = dict(order)
+
+    def get_order(self, tenant_id, order_id):
+        order = self.orders.get((tenant_id, order_id))
+        return dict(order) if order is not None else None
+
+    def write_transition(self, tenant_id, order_id, new_status, created_at, history_entry,
+                         now, expected_step=None, next_step=None, task_token=None):
+        order = self.orders.get((tenant_id, order_id))
+        accepted = order is not None and order.get("status") != "CANCELADO"
+        if accepted and expected_step is START:
+            accepted = order.get("status") == WORKFLOW[0]["status"] and "pending_step" not in order
+        elif accepted and expected_step:
+            accepted = order.get("pending_step") == expected_step
+        if not accepted:
+            raise TransitionRejected(f"Pedido {tenant_id}/{order_id}: transición a {new_status} rechazada")
+
+        order.update({
+            "status": new_status,
+            "status_created": status_created_key(new_status, created_at),
+            "updated_at": now,
+            "steps_completed": order.get("steps_completed", 0) + 1,
+        })
+        if next_step:
+            order.update({
+                "pending_step": next_step,
+                "pending_updated_at": now,
+                "pending_key": pending_step_key(next_step, now),
+            })
+        if task_token:
+            order["pending_task_token"] = task_token
+        if expected_step and not next_step:
+            order.pop("pending_step", None)
+            order.pop("pending_updated_at", None)
+            order.pop("pending_key", None)
+        self.history.append(history_item(tenant_id, order_id, history_entry))
+
+    def publish(self, event_type, detail):
+        self.events.append({"detail-type": event_type, "detail": detail})
+
+    def flush(self):
+        return []
+
+
+# ---------------------------
+# Motor
+# ---------------------------
+class WorkflowEngine:
+    """
+    Aplica el flujo sin Step Functions: arrancar deja pendiente ASSIGN_COOK y
+    cada paso humano completado aplica la transición siguiente. Cada transición
+    es una escritura condicional sobre pending_step, así un paso no se aplica dos veces.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def start(self, order):
+        """order: order_id, tenant_id, created_at, customer_id (como PedidoRecibido)."""
+        return self._apply(WORKFLOW[0], order, START)
+
+    def complete_step(self, tenant_id, order_id, step, staff_id=None, staff_name=None):
+        """
+        Completa el paso humano `step` y aplica la transición que le sigue.
+        Lanza TransitionRejected si el pedido no existe o no espera ese paso.
+        """
+        transition = STEP_TRANSITIONS.get(step)
+        if transition is None:
+            raise ValueError(f"Paso inválido: {step}")
+
+        order = self.backend.get_order(tenant_id, order_id)
+        if order is None:
+            raise TransitionRejected(f"Pedido {tenant_id}/{order_id} no existe", not_found=True)
+
+        order = dict(order, tenant_id=tenant_id, order_id=order_id)
+        return self._apply(transition, order, step, staff_id, staff_name)
+
+    def _apply(self, transition, order, expected_step, staff_id=None, staff_name=None):
+        tenant_id = order["tenant_id"]
+        order_id = order["order_id"]
+        new_status = transition["status"]
+        next_step = transition["waits_for"]
+        now = datetime.now(timezone.utc).isoformat()
+
+        self.backend.write_transition(
+            tenant_id, order_id,
+            new_status=new_status,
+            created_at=order.get("created_at") or "",
+            history_entry=history_entry_for(transition["action"], new_status, now, staff_id, staff_name),
+            now=now,
+            expected_step=expected_step,
+            next_step=next_step,
+        )
+        self.backend.publish(
+            transition["event_type"],
+            status_event_detail(order_id, tenant_id, new_status, now, order.get("customer_id"), order.get("created_at")),
+        )
+        return {
+            "order_id": order_id,
+            "tenant_id": tenant_id,
+            "status": new_status,
+            "pending_step": next_step,
+            "ts": now,
+        }
+
+    def flush(self):
+        """
+        Publica los eventos de las transiciones aplicadas. Los handlers lo llaman
+        una vez al final (un lote de SQS o una acción en bloque => pocas PutEvents).
+        """
+        return self.backend.flush()
+
+
+_engine = None
+
+
+def get_engine():
+    """Motor del contenedor según WORKFLOW_ENGINE (dynamodb | memory)."""
+    global _engine
+    if _engine is None:
+        backend = InMemoryBackend() if engine_mode() == ENGINE_MEMORY else DynamoDBBackend()
+        _engine = WorkflowEngine(backend)
+    return _engine
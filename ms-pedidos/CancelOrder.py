@@ -1,105 +1,130 @@
-import os, json
-import boto3
-from datetime import datetime, timezone
-from utils import response, publish_order_event
-
-ddb = boto3.resource('dynamodb')
-orders_table = ddb.Table(os.environ.get("ORDERS_TABLE", "Orders"))
-
-# Estados finales del flujo ÚNICO (alineado a Fulfillment)
-FINAL_STATUSES = ["ENTREGADO", "CANCELADO"]
-
-
-def lambda_handler(event, context):
-    # -------- 1) tenant_id obligatorio ----------
-    tenant_id = (event.get("headers") or {}).get("x-tenant-id")
-    if not tenant_id:
-        return response(400, {"message": "x-tenant-id header es requerido"})
-
-    path_params = event.get("pathParameters") or {}
-    order_id = path_params.get("order_id")
-
-    if not order_id:
-        return response(400, {"message": "order_id is required in path"})
-
-    try:
-        body = json.loads(event.get("body", "{}"))
-    except json.JSONDecodeError:
-        return response(400, {"message": "Invalid JSON body"})
-
-    cancelled_by = body.get("cancelled_by", "system")
-    reason = body.get("reason", "")
-
-    try:
-        # -------- 2) Obtener pedido con PK compuesta ----------
-        result = orders_table.get_item(
-            Key={"tenant_id": tenant_id, "order_id": order_id}
-        )
-        item = result.get("Item")
-        if not item:
-            return response(404, {"message": "Order not found"})
-
-        current_status = item.get("status", "PENDIENTE")
-
-        if current_status in FINAL_STATUSES:
-            return response(400, {
-                "message": f"Cannot cancel an order with status {current_status}"
-            })
-
-        now = datetime.now(timezone.utc).isoformat()
-        history_entry = {
-            "action": "CANCELLED",
-            "status": "CANCELADO",
-            "timestamp": now,
-            "by": cancelled_by,
-            "reason": reason
-        }
-
-        # -------- 3) Update consistente ----------
-        update_result = orders_table.update_item(
-            Key={"tenant_id": tenant_id, "order_id": order_id},
-            UpdateExpression=(
-                "SET #status = :cancelled, "
-                "updated_at = :updated_at, "
-                "history = list_append(if_not_exists(history, :empty_list), :history_entry)"
-            ),
-            ExpressionAttributeNames={
-                "#status": "status"
-            },
-            ExpressionAttributeValues={
-                ":cancelled": "CANCELADO",
-                ":updated_at": now,
-                ":history_entry": [history_entry],
-                ":empty_list": []
-            },
-            ReturnValues="ALL_NEW"
-        )
-
-        updated_order = update_result.get("Attributes", {})
-
-        # -------- 4) Publicar evento alineado a arquitectura ----------
-        try:
-            publish_order_event(
-                detail_type="PedidoCancelado",
-                detail={
-                    "order_id": order_id,
-                    "tenant_id": tenant_id,
-                    "customer_id": updated_order.get("customer_id"),
-                    "status": updated_order.get("status"),
-                    "reason": reason,
-                    "cancelled_by": cancelled_by,
-                    "timestamp": now
-                }
-            )
-        except Exception as e:
-            print(f"Error publishing PedidoCancelado event: {str(e)}")
-
-        return response(200, {
-            "success": True,
-            "message": "Order cancelled successfully",
-            "data": updated_order
-        })
-
-    except Exception as e:
-        print(f"Error cancelling order: {str(e)}")
-        return response(500, {"message": "Error cancelling order"})
+import os, json
+from datetime import datetime, timezone
+from chinawok_common import aws, history_put, response, status_created_key
+from utils import outbox_record, outbox_put, to_dynamo_item
+
+dynamodb_client = aws.lazy_client("dynamodb")
+ORDERS_TABLE = os.environ.get("ORDERS_TABLE", "Orders")
+
+# Estados finales del flujo ÚNICO (alineado a Fulfillment)
+FINAL_STATUSES = ["ENTREGADO", "CANCELADO"]
+
+
+def lambda_handler(event, context):
+    # -------- 1) tenant_id obligatorio ----------
+    tenant_id = (event.get("headers") or {}).get("x-tenant-id")
+    if not tenant_id:
+        return response(400, {"message": "x-tenant-id header es requerido"})
+
+    path_params = event.get("pathParameters") or {}
+    order_id = path_params.get("order_id")
+
+    if not order_id:
+        return response(400, {"message": "order_id is required in path"})
+
+    try:
+        body = json.loads(event.get("body", "{}"))
+    except json.JSONDecodeError:
+        return response(400, {"message": "Invalid JSON body"})
+
+    cancelled_by = body.get("cancelled_by", "system")
+    reason = body.get("reason", "")
+
+    now = datetime.now(timezone.utc).isoformat()
+    history_entry = {
+        "action": "CANCELLED",
+        "status": "CANCELADO",
+        "timestamp": now,
+        "by": cancelled_by,
+        "reason": reason
+    }
+
+    # OutboxRelay publica el evento
+    event_record = outbox_record(
+        "PedidoCancelado",
+        {
+            "order_id": order_id,
+            "tenant_id": tenant_id,
+            "status": "CANCELADO",
+            "reason": reason,
+            "cancelled_by": cancelled_by,
+            "timestamp": now
+        }
+    )
+
+    try:
+        # -------- 2) Update condicional + historial + PedidoCancelado (outbox) en una transacción ----------
+        # Un solo round trip: la condición reemplaza al get_item previo y evita
+        # la carrera con UpdateOrderStatusStep (no se cancela un pedido ya final).
+        # status_created = CANCELADO#<created_at> sale del propio item
+        # (cancelled_status_created, lo guarda CreateOrder): los filtros from/to de
+        # GET /orders?status=CANCELADO siguen siendo sobre la fecha de creación.
+        # Se limpia el token pendiente: ningún endpoint del staff puede reanudar el flujo
+        # (CancelFulfillmentExecution detiene la ejecución al recibir PedidoCancelado).
+        dynamodb_client.transact_write_items(
+            TransactItems=[
+                {
+                    "Update": {
+                        "TableName": ORDERS_TABLE,
+                        "Key": to_dynamo_item({"tenant_id": tenant_id, "order_id": order_id}),
+                        "ConditionExpression": (
+                            "attribute_exists(order_id) AND NOT #status IN (:final_1, :final_2)"
+                        ),
+                        "UpdateExpression": (
+                            "SET #status = :cancelled, "
+                            "status_created = if_not_exists(cancelled_status_created, :status_created), "
+                            "updated_at = :updated_at "
+                            "REMOVE pending_task_token, pending_step, pending_updated_at, pending_key"
+                        ),
+                        "ExpressionAttributeNames": {
+                            "#status": "status"
+                        },
+                        "ExpressionAttributeValues": to_dynamo_item({
+                            ":final_1": FINAL_STATUSES[0],
+                            ":final_2": FINAL_STATUSES[1],
+                            ":cancelled": "CANCELADO",
+                            # Solo pedidos anteriores a cancelled_status_created (ver backfill en el README)
+                            ":status_created": status_created_key("CANCELADO", now),
+                            ":updated_at": now
+                        }),
+                        "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+                    }
+                },
+                history_put(tenant_id, order_id, history_entry),
+                outbox_put(event_record),
+            ]
+        )
+
+    except dynamodb_client.exceptions.TransactionCanceledException as e:
+        reasons = e.response.get("CancellationReasons") or []
+        update_reason = reasons[0] if reasons else {}
+        if update_reason.get("Code") != "ConditionalCheckFailed":
+            print(f"Error cancelling order: {str(e)}")
+            return response(500, {"message": "Error cancelling order"})
+
+        # Sin Item -> el pedido no existe; con Item -> ya está en un estado final
+        old_item = update_reason.get("Item")
+        if not old_item:
+            return response(404, {"message": "Order not found"})
+
+        current_status = old_item.get("status", {}).get("S")
+        return response(400, {
+            "message": f"Cannot cancel an order with status {current_status}"
+        })
+
+    except Exception as e:
+        print(f"Error cancelling order: {str(e)}")
+        return response(500, {"message": "Error cancelling order"})
+
+    return response(200, {
+        "success": True,
+        "message": "Order cancelled successfully",
+        "data": {
+            "order_id": order_id,
+            "tenant_id": tenant_id,
+            "status": "CANCELADO",
+            "updated_at": now,
+            "cancelled_by": cancelled_by,
+            "reason": reason
+        }
+    })
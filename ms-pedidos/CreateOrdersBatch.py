@@ -0,0 +1,184 @@
+import os, json, time
+from datetime import datetime, timezone
+from decimal import Decimal
+from botocore.exceptions import ClientError
+from chinawok_common import aws, idempotent, response
+from utils import validate_order_body, build_order, create_order_actions, ACTIONS_PER_ORDER
+
+dynamodb_client = aws.lazy_client("dynamodb")
+
+# Máximo de pedidos aceptados por request
+MAX_BATCH_ORDERS = int(os.environ.get("MAX_BATCH_ORDERS", "100"))
+
+# Límite de DynamoDB por llamada a TransactWriteItems (ACTIONS_PER_ORDER = 3 acciones
+# por pedido: pedido, historial INIT y outbox)
+TRANSACT_MAX_ACTIONS = 100
+TRANSACT_MAX_ATTEMPTS = 4
+
+# Errores que se reintentan con backoff (además de los 5xx): el resto no mejora reintentando
+RETRYABLE_ERRORS = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TransactionConflictException",
+    "TransactionInProgressException",
+    "InternalServerError",
+    "ServiceUnavailable",
+}
+# Motivos de cancelación (CancellationReasons) transitorios: no son culpa del pedido
+RETRYABLE_CANCELLATION_REASONS = {
+    "None",
+    "TransactionConflict",
+    "ThrottlingError",
+    "ProvisionedThroughputExceeded",
+}
+
+
+@idempotent("orders:batch")
+def lambda_handler(event, context):
+    """
+    POST /orders/batch
+
+    body:
+    {
+      "orders": [
+        {"customer_id": "...", "items": [{"product_id": "...", "quantity": 1, "price": 10.5}]},
+        ...
+      ]
+    }
+
+    Devuelve un resultado por pedido (mismo orden que el request).
+    """
+    # -------- 1) tenant_id obligatorio (multi-tenant) ----------
+    tenant_id = (event.get("headers") or {}).get("x-tenant-id")
+    if not tenant_id:
+        return response(400, {"message": "x-tenant-id header es requerido"})
+
+    # Parsear body con Decimal para los floats
+    try:
+        body = json.loads(event.get("body") or "{}", parse_float=Decimal)
+    except json.JSONDecodeError:
+        return response(400, {"message": "Invalid JSON body"})
+
+    orders_in = body.get("orders") if isinstance(body, dict) else None
+    if not isinstance(orders_in, list) or len(orders_in) == 0:
+        return response(400, {"message": "orders must be a non-empty list"})
+
+    if len(orders_in) > MAX_BATCH_ORDERS:
+        return response(400, {"message": f"A batch accepts at most {MAX_BATCH_ORDERS} orders"})
+
+    # -------- 2) Validar y armar todos los pedidos en una pasada ----------
+    now = datetime.now(timezone.utc).isoformat()
+    results = []
+    orders = []
+
+    for index, order_body in enumerate(orders_in):
+        error = validate_order_body(order_body)
+        if error:
+            results.append({"index": index, "success": False, "message": error})
+            continue
+
+        order = build_order(tenant_id, order_body, now)
+        orders.append(order)
+        results.append({"index": index, "success": True, "order_id": order["order_id"]})
+
+    # -------- 3) Guardar pedidos + PedidoRecibido (outbox) en transacciones ----------
+    # OutboxRelay publica los eventos en lotes desde el stream del outbox
+    failed_writes = transact_put_orders(orders)
+
+    for result in results:
+        if result.get("order_id") in failed_writes:
+            result.update({
+                "success": False,
+                "message": "Error creating order",
+                "error_code": failed_writes[result["order_id"]],
+            })
+            del result["order_id"]
+
+    created = sum(1 for r in results if r["success"])
+    status = 201 if created == len(results) else 207
+
+    return response(status, {
+        "success": created == len(results),
+        "message": f"{created} de {len(results)} pedidos creados",
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    })
+
+
+def transact_put_orders(orders):
+    """
+    Guarda cada pedido junto con su historial INIT y su registro de outbox usando
+    TransactWriteItems (hasta 33 pedidos por llamada).
+
+    Un pedido rechazado (condición fallida, validación, tamaño) no arrastra al resto
+    de su transacción: se identifica por CancellationReasons, se marca como fallido
+    y se reenvían los demás. Solo throttling, conflictos y 5xx se reintentan con
+    backoff exponencial.
+    Devuelve {order_id: código de error} de los pedidos que no se pudieron guardar.
+    """
+    failed = {}
+    per_call = TRANSACT_MAX_ACTIONS // ACTIONS_PER_ORDER
+
+    for start in range(0, len(orders), per_call):
+        failed.update(transact_put_chunk(orders[start:start + per_call]))
+
+    return failed
+
+
+def transact_put_chunk(chunk):
+    failed = {}
+    pending = list(chunk)
+    attempt = 0
+
+    while pending:
+        try:
+            dynamodb_client.transact_write_items(
+                TransactItems=[a for o in pending for a in create_order_actions(o)]
+            )
+            return failed
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+            print(f"Error saving {len(pending)} orders: {str(e)}")
+
+            if code == "TransactionCanceledException":
+                rejected = rejected_orders(e.response.get("CancellationReasons") or [], pending)
+                if rejected:
+                    # Se descartan solo los pedidos culpables y se reenvía el resto
+                    failed.update(rejected)
+                    pending = [o for o in pending if o["order_id"] not in rejected]
+                    continue
+            elif code not in RETRYABLE_ERRORS and status < 500:
+                if len(pending) > 1:
+                    # Error de toda la llamada (ej. ValidationException por tamaño):
+                    # un pedido por transacción para aislar al culpable
+                    for order in pending:
+                        failed.update(transact_put_chunk([order]))
+                    return failed
+                failed[pending[0]["order_id"]] = code
+                return failed
+
+        attempt += 1
+        if attempt >= TRANSACT_MAX_ATTEMPTS:
+            failed.update((o["order_id"], "RetriesExhausted") for o in pending)
+            return failed
+        time.sleep(min(0.05 * (2 ** attempt), 1))
+
+    return failed
+
+
+def rejected_orders(reasons, pending):
+    """
+    {order_id: motivo} de los pedidos con alguna acción cancelada por un motivo
+    propio (ConditionalCheckFailed, ValidationError, ...). Las acciones van en
+    bloques de ACTIONS_PER_ORDER por pedido, en el mismo orden que `pending`.
+    """
+    rejected = {}
+    for i, reason in enumerate(reasons):
+        code = reason.get("Code")
+        if code and code not in RETRYABLE_CANCELLATION_REASONS:
+            order = pending[i // ACTIONS_PER_ORDER]
+            rejected.setdefault(order["order_id"], code)
+    return rejected
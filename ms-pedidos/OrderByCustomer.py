@@ -1,59 +1,63 @@
-import os
-import json
-import boto3
-from boto3.dynamodb.conditions import Key, Attr
-from decimal import Decimal
-from utils import response
-
-ddb = boto3.resource("dynamodb")
-orders_table = ddb.Table(os.environ.get("ORDERS_TABLE", "Orders"))
-
-def clean_decimals(obj):
-    if isinstance(obj, list):
-        return [clean_decimals(i) for i in obj]
-    if isinstance(obj, dict):
-        return {k: clean_decimals(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        if obj % 1 == 0:
-            return int(obj)
-        return float(obj)
-    return obj
-
-def lambda_handler(event, context):
-    try:
-        # tenant obligatorio
-        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
-        if not tenant_id:
-            return response(400, {"message": "x-tenant-id header es requerido"})
-
-        path_params = event.get("pathParameters") or {}
-        query_params = event.get("queryStringParameters") or {}
-
-        customer_id = (
-            path_params.get("customer_id")
-            or (query_params.get("customer_id") if query_params else None)
-        )
-
-        if not customer_id:
-            return response(400, {"message": "customer_id is required"})
-
-        # Query por cliente usando GSI CustomerIndex
-        # + filtro tenant para no mezclar sedes
-        resp = orders_table.query(
-            IndexName="CustomerIndex",
-            KeyConditionExpression=Key("customer_id").eq(customer_id),
-            FilterExpression=Attr("tenant_id").eq(tenant_id)
-        )
-
-        items = resp.get("Items", [])
-        items.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        items = clean_decimals(items)
-
-        return response(200, {"success": True, "data": items})
-
-    except Exception as e:
-        print(f"Error listing orders by user: {str(e)}")
-        return response(500, {
-            "message": "Error listing orders by user",
-            "error": str(e)
-        })
+import os
+from boto3.dynamodb.conditions import Key
+from chinawok_common import aws, response, parse_limit, encode_cursor, decode_cursor, tenant_customer_key
+
+orders_table = aws.lazy_table(os.environ.get("ORDERS_TABLE", "Orders"))
+
+def lambda_handler(event, context):
+    try:
+        # tenant obligatorio
+        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
+        if not tenant_id:
+            return response(400, {"message": "x-tenant-id header es requerido"})
+
+        path_params = event.get("pathParameters") or {}
+        query_params = event.get("queryStringParameters") or {}
+
+        customer_id = (
+            path_params.get("customer_id")
+            or (query_params.get("customer_id") if query_params else None)
+        )
+
+        if not customer_id:
+            return response(400, {"message": "customer_id is required"})
+
+        # Paginación: limit + cursor opaco
+        try:
+            limit = parse_limit(query_params)
+            start_key = decode_cursor(query_params.get("cursor"))
+        except ValueError:
+            return response(400, {"message": "Invalid limit or cursor"})
+
+        partition = tenant_customer_key(tenant_id, customer_id)
+        if start_key and start_key.get("tenant_customer") != partition:
+            return response(400, {"message": "Invalid limit or cursor"})
+
+        # Query por tenant + cliente usando TenantCustomerIndex
+        # (ya viene ordenado por created_at, más recientes primero)
+        query_kwargs = {
+            "IndexName": "TenantCustomerIndex",
+            "KeyConditionExpression": Key("tenant_customer").eq(partition),
+            "ScanIndexForward": False,
+            "Limit": limit,
+        }
+        if start_key:
+            query_kwargs["ExclusiveStartKey"] = start_key
+
+        resp = orders_table.query(**query_kwargs)
+
+        items = resp.get("Items", [])
+        next_cursor = encode_cursor(resp.get("LastEvaluatedKey"))
+
+        return response(200, {
+            "success": True,
+            "data": items,
+            "next_cursor": next_cursor
+        })
+
+    except Exception as e:
+        print(f"Error listing orders by user: {str(e)}")
+        return response(500, {
+            "message": "Error listing orders by user",
+            "error": str(e)
+        })
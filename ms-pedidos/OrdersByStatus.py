@@ -1,67 +1,88 @@
-import os
-import boto3
-from boto3.dynamodb.conditions import Key
-from decimal import Decimal
-from utils import response
-
-ddb = boto3.resource("dynamodb")
-orders_table = ddb.Table(os.environ.get("ORDERS_TABLE", "Orders"))
-
-# Estados del FLUJO ÚNICO (Fulfillment)
-VALID_STATUSES = [
-    "PENDIENTE",
-    "COCINANDO",
-    "EMPACANDO",
-    "EN_REPARTO",
-    "ENTREGADO",
-    "CANCELADO"
-]
-
-def clean_decimals(obj):
-    if isinstance(obj, list):
-        return [clean_decimals(i) for i in obj]
-    if isinstance(obj, dict):
-        return {k: clean_decimals(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        if obj % 1 == 0:
-            return int(obj)
-        return float(obj)
-    return obj
-
-def lambda_handler(event, context):
-    try:
-        # tenant obligatorio
-        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
-        if not tenant_id:
-            return response(400, {"message": "x-tenant-id header es requerido"})
-
-        query_params = event.get("queryStringParameters") or {}
-        status = query_params.get("status") if query_params else None
-
-        if not status:
-            return response(400, {"message": "status query parameter is required"})
-
-        if status not in VALID_STATUSES:
-            return response(400, {
-                "message": f"Invalid status. Valid statuses: {', '.join(VALID_STATUSES)}"
-            })
-
-        # Query por tenant + status usando StatusIndex
-        resp = orders_table.query(
-            IndexName="StatusIndex",
-            KeyConditionExpression=
-                Key("tenant_id").eq(tenant_id) & Key("status").eq(status)
-        )
-
-        items = resp.get("Items", [])
-        items.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        items = clean_decimals(items)
-
-        return response(200, {"success": True, "data": items})
-
-    except Exception as e:
-        print(f"Error listing orders by status: {str(e)}")
-        return response(500, {
-            "message": "Error listing orders by status",
-            "error": str(e)
-        })
+import os
+from boto3.dynamodb.conditions import Key
+from chinawok_common import aws, response, parse_limit, encode_cursor, decode_cursor, status_created_key
+
+orders_table = aws.lazy_table(os.environ.get("ORDERS_TABLE", "Orders"))
+
+# Estados del FLUJO ÚNICO (Fulfillment)
+VALID_STATUSES = [
+    "PENDIENTE",
+    "COCINANDO",
+    "EMPACANDO",
+    "EN_REPARTO",
+    "ENTREGADO",
+    "CANCELADO"
+]
+
+# Mayor que cualquier caracter de un timestamp ISO: vuelve inclusivo el límite superior
+RANGE_END = "\uffff"
+
+def lambda_handler(event, context):
+    try:
+        # tenant obligatorio
+        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
+        if not tenant_id:
+            return response(400, {"message": "x-tenant-id header es requerido"})
+
+        query_params = event.get("queryStringParameters") or {}
+        status = query_params.get("status") if query_params else None
+
+        if not status:
+            return response(400, {"message": "status query parameter is required"})
+
+        if status not in VALID_STATUSES:
+            return response(400, {
+                "message": f"Invalid status. Valid statuses: {', '.join(VALID_STATUSES)}"
+            })
+
+        # Rango de fechas opcional sobre created_at (ISO 8601, prefijos válidos: "2025-01-31")
+        date_from = query_params.get("from") or ""
+        date_to = query_params.get("to")
+        if date_to is not None and date_from > date_to:
+            return response(400, {"message": "from must be lower than or equal to to"})
+
+        lower = status_created_key(status, date_from)
+        upper = status_created_key(status, (date_to or "") + RANGE_END)
+
+        # Paginación: limit + cursor opaco
+        try:
+            limit = parse_limit(query_params)
+            start_key = decode_cursor(query_params.get("cursor"))
+        except ValueError:
+            return response(400, {"message": "Invalid limit or cursor"})
+
+        if start_key and (
+            start_key.get("tenant_id") != tenant_id
+            or not lower <= str(start_key.get("status_created", "")) <= upper
+        ):
+            return response(400, {"message": "Invalid limit or cursor"})
+
+        # Query por tenant + status#created_at usando StatusCreatedIndex
+        # (una sola consulta acotada, ya ordenada: más recientes primero)
+        query_kwargs = {
+            "IndexName": "StatusCreatedIndex",
+            "KeyConditionExpression":
+                Key("tenant_id").eq(tenant_id) & Key("status_created").between(lower, upper),
+            "ScanIndexForward": False,
+            "Limit": limit,
+        }
+        if start_key:
+            query_kwargs["ExclusiveStartKey"] = start_key
+
+        resp = orders_table.query(**query_kwargs)
+
+        items = resp.get("Items", [])
+        next_cursor = encode_cursor(resp.get("LastEvaluatedKey"))
+
+        return response(200, {
+            "success": True,
+            "data": items,
+            "next_cursor": next_cursor
+        })
+
+    except Exception as e:
+        print(f"Error listing orders by status: {str(e)}")
+        return response(500, {
+            "message": "Error listing orders by status",
+            "error": str(e)
+        })
@@ -0,0 +1,82 @@
+import os, time
+from boto3.dynamodb.types import TypeDeserializer
+from chinawok_common import put_event_entries, PUT_EVENTS_MAX_ENTRIES
+
+_deserializer = TypeDeserializer()
+
+# Reintentos dentro de la invocación antes de devolver el registro al stream
+PUBLISH_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_PUBLISH_MAX_ATTEMPTS", "3"))
+
+
+def lambda_handler(event, context):
+    """
+    DynamoDB Stream (OUTBOX_TABLE, INSERT) -> EventBridge.
+
+    Publica los registros del outbox en lotes de hasta 10 entradas respetando
+    el orden del stream: un lote nunca lleva dos eventos del mismo pedido, y si
+    un evento no se puede publicar se reporta su SequenceNumber para que Lambda
+    reintente desde ahí (los eventos posteriores de ese pedido no se adelantan).
+    """
+    records = [
+        r for r in event.get("Records", [])
+        if r.get("eventName") == "INSERT"
+    ]
+
+    for chunk in build_chunks(records):
+        entries = [to_entry(r) for r in chunk]
+        pending = list(range(len(chunk)))
+
+        for attempt in range(PUBLISH_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(min(0.1 * (2 ** attempt), 2))
+            errors = put_event_entries([entries[i] for i in pending])
+            pending = [i for i, error in zip(pending, errors) if error]
+            if not pending:
+                break
+
+        if pending:
+            # El primer registro fallido (en orden de stream) marca el checkpoint
+            first_failed = chunk[pending[0]]
+            print(
+                f"Outbox relay: {len(pending)} eventos sin publicar, "
+                f"reintentando desde {first_failed['dynamodb']['SequenceNumber']}"
+            )
+            return {
+                "batchItemFailures": [
+                    {"itemIdentifier": first_failed["dynamodb"]["SequenceNumber"]}
+                ]
+            }
+
+    print(f"Outbox relay: {len(records)} eventos publicados")
+    return {"batchItemFailures": []}
+
+
+def build_chunks(records):
+    """
+    Agrupa registros consecutivos en lotes de hasta 10 sin repetir pedido
+    (aggregate_id) dentro de un mismo lote.
+    """
+    chunk, aggregates = [], set()
+    for record in records:
+        aggregate_id = record["dynamodb"]["Keys"]["aggregate_id"]["S"]
+        if len(chunk) == PUT_EVENTS_MAX_ENTRIES or aggregate_id in aggregates:
+            yield chunk
+            chunk, aggregates = [], set()
+        chunk.append(record)
+        aggregates.add(aggregate_id)
+    if chunk:
+        yield chunk
+
+
+def to_entry(record):
+    """Convierte el NewImage del outbox en una entrada de PutEvents."""
+    image = {
+        k: _deserializer.deserialize(v)
+        for k, v in record["dynamodb"]["NewImage"].items()
+    }
+    return {
+        "Source": image["source"],
+        "DetailType": image["detail_type"],
+        "Detail": image["detail"],
+        "EventBusName": os.environ.get("EVENT_BUS_NAME", "default"),
+    }
@@ -0,0 +1,95 @@
+"""
+Backfill de cancelled_status_created y de status_created de los cancelados.
+
+CancelOrder copia cancelled_status_created (CANCELADO#<created_at>, lo guarda
+CreateOrder) en status_created dentro de su único update. Este script, de una
+sola corrida:
+
+  1) agrega cancelled_status_created a los pedidos anteriores que no lo tienen;
+  2) corrige status_created de los pedidos CANCELADO que quedaron indexados por
+     la fecha de cancelación (CANCELADO#<cancelado_en>) en vez de por created_at.
+
+Es un scan completo de la tabla: migración puntual, no corre en el request path.
+Cada escritura es condicional, se puede repetir sin efectos.
+
+Uso (desde ms-pedidos):
+
+    ORDERS_TABLE=... PYTHONPATH=../layers/chinawok_common/python \\
+        python scripts/backfill_cancelled_status_created.py [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+from chinawok_common import aws, status_created_key
+
+ORDERS_TABLE = os.environ.get("ORDERS_TABLE", "Orders")
+
+
+def backfill_order(table, order, dry_run=False):
+    """Devuelve lo que se corrigió del pedido: set con "cancelled_key" y/o "status_created"."""
+    created_at = order.get("created_at")
+    if not created_at:
+        return set()
+
+    expected = status_created_key("CANCELADO", created_at)
+    fixes = set()
+    sets, values = [], {":expected": expected}
+    if order.get("cancelled_status_created") != expected:
+        sets.append("cancelled_status_created = :expected")
+        fixes.add("cancelled_key")
+    if order.get("status") == "CANCELADO" and order.get("status_created") != expected:
+        sets.append("status_created = :expected")
+        fixes.add("status_created")
+    if not sets or dry_run:
+        return fixes
+
+    values[":created_at"] = created_at
+    update_kwargs = {
+        "Key": {"tenant_id": order["tenant_id"], "order_id": order["order_id"]},
+        "UpdateExpression": "SET " + ", ".join(sets),
+        "ConditionExpression": "created_at = :created_at",
+        "ExpressionAttributeValues": values,
+    }
+    if "status_created" in fixes:
+        update_kwargs["ConditionExpression"] += " AND #st = :cancelled"
+        update_kwargs["ExpressionAttributeNames"] = {"#st": "status"}
+        values[":cancelled"] = "CANCELADO"
+    try:
+        table.update_item(**update_kwargs)
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        # Cambió entre el scan y el update: la próxima corrida lo revisa
+        return set()
+    return fixes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    table = aws.table(ORDERS_TABLE)
+    scan_kwargs = {
+        "ProjectionExpression": "tenant_id, order_id, #st, status_created, cancelled_status_created, created_at",
+        "ExpressionAttributeNames": {"#st": "status"},
+    }
+    counts = {"scanned": 0, "cancelled_key": 0, "status_created": 0}
+    while True:
+        resp = table.scan(**scan_kwargs)
+        for order in resp.get("Items", []):
+            counts["scanned"] += 1
+            for fix in backfill_order(table, order, args.dry_run):
+                counts[fix] += 1
+        if "LastEvaluatedKey" not in resp:
+            break
+        scan_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    prefix = "[dry-run] " if args.dry_run else ""
+    print(f"{prefix}{counts['scanned']} pedidos revisados: "
+          f"{counts['cancelled_key']} con cancelled_status_created nuevo, "
+          f"{counts['status_created']} cancelados reindexados por created_at")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
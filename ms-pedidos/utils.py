@@ -1,72 +1,155 @@
-import os
-import json
-import boto3
-from datetime import datetime, timezone
-from decimal import Decimal
-
-# ---------------------------
-# Utils: limpieza de Decimals
-# ---------------------------
-def clean_decimals(obj):
-    if isinstance(obj, list):
-        return [clean_decimals(i) for i in obj]
-    if isinstance(obj, dict):
-        return {k: clean_decimals(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        # si es número entero, devuelve int; si no, float
-        return int(obj) if obj % 1 == 0 else float(obj)
-    return obj
-
-
-# ---------------------------
-# Utils: respuestas API Gateway
-# ---------------------------
-def response(status, body):
-    body = clean_decimals(body)
-    return {
-        "statusCode": status,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": (
-                "Content-Type,X-Amz-Date,Authorization,X-Api-Key,"
-                "X-Amz-Security-Token,x-tenant-id"
-            ),
-            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE,PATCH"
-        },
-        "body": json.dumps(body, default=str)
-    }
-
-
-# ---------------------------
-# Utils: publicar eventos EB
-# ---------------------------
-events_client = boto3.client("events")
-
-def publish_order_event(detail_type: str, detail: dict, source: str = "orders.service"):
-    """
-    Envía un evento a EventBridge.
-    Usa el bus definido en EVENT_BUS_NAME (si no existe, usa default).
-    """
-    detail = dict(detail)  # copia defensiva
-    detail["event_time"] = datetime.now(timezone.utc).isoformat()
-
-    # Limpia Decimals para que json.dumps no falle
-    detail = clean_decimals(detail)
-
-    bus_name = os.environ.get("EVENT_BUS_NAME", "default")
-
-    try:
-        resp = events_client.put_events(
-            Entries=[
-                {
-                    "Source": source,
-                    "DetailType": detail_type,
-                    "Detail": json.dumps(detail, default=str),
-                    "EventBusName": bus_name,
-                }
-            ]
-        )
-        return resp
-    except Exception as e:
-        print(f"Error putting event {detail_type} to bus {bus_name}: {str(e)}")
-        raise
+import os
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from chinawok_common import dumps, history_put, to_dynamo_item, tenant_customer_key, status_created_key
+
+# Lo común a todos los servicios (response, eventos, paginación, claves de
+# índices) vive en el layer chinawok_common; aquí solo lo propio de Pedidos.
+
+# ---------------------------
+# Utils: armado de pedidos
+# ---------------------------
+def validate_order_body(body):
+    """
+    Valida el body de un pedido. Devuelve el mensaje de error o None si es válido.
+    """
+    if not isinstance(body, dict):
+        return "order must be a JSON object"
+
+    required_fields = ["customer_id", "items"]
+    for field in required_fields:
+        if field not in body:
+            return f"{field} is required"
+
+    if not isinstance(body["items"], list) or len(body["items"]) == 0:
+        return "items must be a non-empty list"
+
+    for item in body["items"]:
+        if not isinstance(item, dict) or "product_id" not in item or "quantity" not in item:
+            return "Each item must contain product_id and quantity"
+
+    return None
+
+
+def build_order(tenant_id, body, now):
+    """
+    Arma el pedido (estado inicial PENDIENTE) a partir de un body ya validado.
+    Normaliza price/quantity a Decimal y calcula el total.
+    """
+    # Calcular total usando Decimal
+    total = Decimal("0")
+    for item in body["items"]:
+        unit_price = item.get("price", Decimal("0"))
+        if not isinstance(unit_price, Decimal):
+            unit_price = Decimal(str(unit_price))
+
+        quantity = item.get("quantity", 0)
+        if not isinstance(quantity, Decimal):
+            quantity = Decimal(str(quantity))
+
+        item["price"] = unit_price
+        item["quantity"] = quantity
+
+        total += unit_price * quantity
+
+    return {
+        "tenant_id": tenant_id,                 # <- CLAVE multi-tenant
+        "order_id": uuid.uuid4().hex,
+        "customer_id": body["customer_id"],
+        "tenant_customer": tenant_customer_key(tenant_id, body["customer_id"]),  # <- TenantCustomerIndex
+        "status": "PENDIENTE",                  # <- MISMO estado inicial que Fulfillment
+        "status_created": status_created_key("PENDIENTE", now),  # <- StatusCreatedIndex
+        # Clave de StatusCreatedIndex al cancelar: CancelOrder la copia en status_created
+        # dentro de su único update (SET status_created = cancelled_status_created)
+        "cancelled_status_created": status_created_key("CANCELADO", now),
+        "total": total,
+        "items": body["items"],
+        "created_at": now,
+        "updated_at": now,
+        "steps_completed": 1,                   # <- INIT; el historial va en OrderHistoryTable
+    }
+
+
+def init_history_entry(order):
+    """Primera entrada del historial (INIT), se guarda junto con el pedido."""
+    return {
+        "action": "INIT",
+        "status": "PENDIENTE",
+        "timestamp": order["created_at"],
+        "by": order.get("customer_id", "unknown")
+    }
+
+
+def order_received_detail(order):
+    """Detail del evento PedidoRecibido (EXACTO al patrón del Fulfillment)."""
+    return {
+        "order_id": order["order_id"],
+        "tenant_id": order["tenant_id"],
+        "customer_id": order["customer_id"],
+        "total": order["total"],
+        "items": order["items"],
+        "created_at": order["created_at"]
+    }
+
+
+# ---------------------------
+# Utils: outbox transaccional
+# ---------------------------
+# Los eventos no se publican en el request: se guardan en OUTBOX_TABLE dentro de
+# la misma transacción que el pedido y OutboxRelay los publica desde el stream.
+OUTBOX_RETENTION_SECONDS = 7 * 24 * 3600
+
+
+def outbox_record(detail_type: str, detail: dict, source: str = "orders.service"):
+    """
+    Arma el registro de outbox de un evento de pedido.
+
+    aggregate_id (tenant_id#order_id) + event_id (timestamp#uuid) mantienen el
+    orden de los eventos de un mismo pedido en el stream.
+    """
+    now = datetime.now(timezone.utc)
+    detail = dict(detail)  # copia defensiva
+    detail["event_time"] = now.isoformat()
+
+    return {
+        "aggregate_id": f"{detail['tenant_id']}#{detail['order_id']}",
+        "event_id": f"{now.isoformat()}#{uuid.uuid4().hex}",
+        "source": source,
+        "detail_type": detail_type,
+        "detail": dumps(detail),
+        "created_at": now.isoformat(),
+        "expires_at": int(now.timestamp()) + OUTBOX_RETENTION_SECONDS,  # TTL
+    }
+
+
+def outbox_put(record: dict):
+    """Acción Put de TransactWriteItems para un registro de outbox."""
+    return {
+        "Put": {
+            "TableName": os.environ.get("OUTBOX_TABLE", "Outbox"),
+            "Item": to_dynamo_item(record),
+        }
+    }
+
+
+# Pedido + historial INIT + outbox
+ACTIONS_PER_ORDER = 3
+
+
+def create_order_actions(order: dict):
+    """
+    Acciones de TransactWriteItems para crear un pedido: el pedido, su entrada
+    INIT del historial y su PedidoRecibido en el outbox (se guardan todos o ninguno).
+    """
+    return [
+        {
+            "Put": {
+                "TableName": os.environ.get("ORDERS_TABLE", "Orders"),
+                "Item": to_dynamo_item(order),
+                "ConditionExpression": "attribute_not_exists(order_id)",
+            }
+        },
+        history_put(order["tenant_id"], order["order_id"], init_history_entry(order)),
+        outbox_put(outbox_record("PedidoRecibido", order_received_detail(order))),
+    ]
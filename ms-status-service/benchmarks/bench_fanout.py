@@ -0,0 +1,83 @@
+"""
+Throughput del fan-out WebSocket sin AWS.
+
+Usa InMemoryConnectionStore y LocalConnectionsApi (sustituto de
+apigatewaymanagementapi con latencia simulada por post_to_connection):
+N tablets suscritas al tenant, M clientes suscritos a su pedido y una parte
+de conexiones ya cerradas. Verifica entregas, que ninguna conexión reciba el
+mismo evento dos veces y que las cerradas se borren.
+
+Uso (desde ms-status-service):
+
+    python benchmarks/bench_fanout.py [--tablets 500] [--orders 200] [--events 20] [--latency-ms 5]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "layers", "chinawok_common", "python"))
+
+from realtime import (  # noqa: E402
+    InMemoryConnectionStore, LocalConnectionsApi, fan_out, order_topic, status_message, tenant_topic,
+)
+
+TENANT = "LIMA_CENTRO"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tablets", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--gone", type=float, default=0.05, help="fracción de tablets ya desconectadas")
+    args = parser.parse_args()
+
+    store = InMemoryConnectionStore()
+    api = LocalConnectionsApi(latency=args.latency_ms / 1000)
+
+    tablets = [f"tablet-{i}" for i in range(args.tablets)]
+    gone = set(tablets[:int(len(tablets) * args.gone)])
+    for connection_id in tablets:
+        store.register(connection_id, TENANT)
+        store.subscribe(connection_id, tenant_topic(TENANT), int(time.time()) + 3600)
+        if connection_id not in gone:
+            api.connect(connection_id)
+
+    orders = [uuid.uuid4().hex for _ in range(args.orders)]
+    for order_id in orders:
+        connection_id = f"cliente-{order_id}"
+        store.register(connection_id, TENANT)
+        store.subscribe(connection_id, order_topic(TENANT, order_id), int(time.time()) + 3600)
+        api.connect(connection_id)
+        # Una tablet que también sigue un pedido recibe el evento una sola vez
+        store.subscribe(tablets[-1], order_topic(TENANT, order_id), int(time.time()) + 3600)
+
+    started = time.perf_counter()
+    totals = {"sent": 0, "gone": 0, "failed": 0}
+    for i in range(args.events):
+        order_id = orders[i % len(orders)]
+        detail = {"order_id": order_id, "tenant_id": TENANT, "status": "COCINANDO"}
+        counts = fan_out(store, api, TENANT, order_id, status_message("CocinaIniciada", detail))
+        for key, value in counts.items():
+            totals[key] += value
+    elapsed = time.perf_counter() - started
+
+    live_tablets = len(tablets) - len(gone)
+    expected = args.events * (live_tablets + 1)
+    assert totals["sent"] == expected, (totals, expected)
+    assert totals["gone"] == len(gone), totals
+    assert len(api.messages[tablets[-1]]) == args.events
+    assert not any(store.subscribers(tenant_topic(TENANT)).count(c) for c in gone)
+
+    print(f"{args.events} eventos, {totals['sent']} mensajes en {elapsed * 1000:.0f} ms "
+          f"({totals['sent'] / elapsed:,.0f} mensajes/s con {args.latency_ms} ms por envío); "
+          f"{totals['gone']} conexiones cerradas borradas")
+
+
+if __name__ == "__main__":
+    main()
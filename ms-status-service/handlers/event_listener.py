@@ -1,79 +1,374 @@
-import json
-import os
-from datetime import datetime, timezone
-import boto3
-from utils import response
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(os.environ["ORDERS_TABLE"])
-
-# Mapeo opcional de tipo de evento -> etiqueta corta (solo para orden/timeline)
-EVENT_LABELS = {
-    "PedidoRecibido": "pedido_recibido",
-    "PedidoInicializado": "pedido_inicializado",
-    "CocinaIniciada": "cocina_iniciada",
-    "EmpaqueIniciado": "empaque_iniciado",
-    "RepartoIniciado": "reparto_iniciado",
-    "PedidoEntregado": "pedido_entregado",
-    "PedidoCancelado": "pedido_cancelado",
-}
-
-def handle_order_event(event, context):
-    print(f"Evento recibido: {json.dumps(event)}")
-
-    try:
-        detail = event.get("detail", {})
-        event_type = event.get("detail-type")
-        order_id = detail.get("order_id")
-        tenant_id = detail.get("tenant_id")
-
-        if not event_type or not order_id or not tenant_id:
-            return response(400, {"error": "Missing required fields in event",
-                    "required": ["detail-type", "detail.order_id", "detail.tenant_id"]})
-
-        now = datetime.now(timezone.utc).isoformat()
-
-        # Base común de historial de eventos
-        history_entry = {
-            "event_type": event_type,
-            "event_label": EVENT_LABELS.get(event_type, event_type),
-            "timestamp": now,
-            "event_time": detail.get("event_time", now),
-            "order_id": order_id,
-            "tenant_id": tenant_id,
-            "status": detail.get("status"),          # casi todos los eventos ya lo envían
-            "customer_id": detail.get("customer_id"),
-            "staff_id": detail.get("staff_id"),
-            "staff_name": detail.get("staff_name"),
-            "reason": detail.get("reason"),
-            "total": detail.get("total"),
-        }
-
-        # Limpieza de None para no ensuciar el event_history
-        history_entry = {k: v for k, v in history_entry.items() if v is not None}
-
-        table.update_item(
-            Key={"tenant_id": tenant_id, "order_id": order_id},
-            UpdateExpression=(
-                "SET event_history = list_append(if_not_exists(event_history, :empty_list), :history_entry), "
-                "last_event_update = :timestamp"
-            ),
-            ExpressionAttributeValues={
-                ":history_entry": [history_entry],
-                ":empty_list": [],
-                ":timestamp": now
-            },
-            ReturnValues="UPDATED_NEW"
-        )
-
-        print(f"Pedido {tenant_id}/{order_id} actualizado con evento {event_type}")
-
-        return response(200, {"message": "Event processed successfully",
-                "order_id": order_id,
-                "tenant_id": tenant_id,
-                "event_type": event_type})
-
-    except Exception as e:
-        print(f"Error procesando evento: {str(e)}")
-        
-        return response(500, {"error": str(e)})
-        
+import json
+import os
+import time
+import uuid
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from datetime import datetime, timezone
+from decimal import Decimal
+from chinawok_common import (
+    aws, history_event_key, history_put, order_history_key, stats_batch_update_actions,
+    SOURCE_EVENTBRIDGE, SOURCE_WORKFLOW,
+)
+from chinawok_common.tenant_stats import STATUS_EVENTS
+from realtime import ConnectionStore, connections_api, fan_out_tenant, status_message
+ORDERS_TABLE = os.environ["ORDERS_TABLE"]
+ORDER_HISTORY_TABLE = os.environ["ORDER_HISTORY_TABLE"]
+history_table = aws.lazy_table(ORDER_HISTORY_TABLE)
+dynamodb_client = aws.lazy_client("dynamodb")
+
+# Suscriptores WebSocket (tablero del tenant o un pedido)
+connection_store = ConnectionStore()
+ws_api = connections_api()
+
+# TransactWriteItems admite 100 acciones: eventos por transacción, dejando lugar
+# al Update del pedido (historial) o a los de TenantStats (ALL + días)
+MAX_EVENTS_PER_TRANSACTION = 90
+
+# Intentos de la transacción de TenantStats de un tenant ante TransactionConflict
+# (otra invocación escribiendo el mismo item ALL a la vez)
+STATS_MAX_ATTEMPTS = int(os.environ.get("STATS_MAX_ATTEMPTS", "4"))
+
+class PedidoInexistente(Exception):
+    """Eventos de un pedido que no está en ORDERS_TABLE (no se crean pedidos fantasma)."""
+
+
+# Mapeo opcional de tipo de evento -> etiqueta corta (solo para orden/timeline)
+EVENT_LABELS = {
+    "PedidoRecibido": "pedido_recibido",
+    "PedidoInicializado": "pedido_inicializado",
+    "CocinaIniciada": "cocina_iniciada",
+    "EmpaqueIniciado": "empaque_iniciado",
+    "RepartoIniciado": "reparto_iniciado",
+    "PedidoEntregado": "pedido_entregado",
+    "PedidoCancelado": "pedido_cancelado",
+}
+
+def handle_order_event(event, context):
+    """
+    SQS (StatusEventsQueue) <- EventBridge (eventos de estado de Pedidos y Fulfillment)
+
+    Cada record trae en el body el evento de EventBridge. El lote se procesa así:
+      1) Se descartan los repetidos dentro del lote por el "id" de EventBridge.
+      2) Se agrupan por pedido: una transacción por pedido con un Put condicional
+         de historial por evento (event_key determinístico por id: una redelivery
+         de otro lote choca y se descarta) y un solo Update de last_event_update.
+      3) Los ADD de TenantStats se suman por tenant y se aplican una vez por lote
+         (aplicar_estadisticas), fuera de las transacciones por pedido: una ráfaga
+         de un tenant no serializa cada pedido sobre su item ALL.
+      4) Un push WebSocket por tenant con el último evento de cada pedido
+         (los suscriptores del tenant se leen una vez por lote).
+    Los pedidos cuya transacción falla (o cuyo tenant no pudo sumar sus contadores)
+    se reportan en batchItemFailures: SQS vuelve a entregar solo esos mensajes y,
+    tras varios intentos, los deja en la DLQ.
+
+    Invocado directamente con un evento de EventBridge (pruebas), lo trata como
+    un lote de uno.
+    """
+    if "Records" in event:
+        records = event["Records"]
+    else:
+        records = [{"messageId": event.get("id", "direct"), "body": json.dumps(event)}]
+    if not records:
+        return {"batchItemFailures": []}
+
+    pedidos, vistos, descartados, duplicados = {}, set(), 0, 0
+    for record in records:
+        parsed = parse_record(record)
+        if parsed is None:
+            descartados += 1
+            continue
+        event_id = parsed["id"]
+        if event_id and event_id in vistos:
+            # Repetido dentro del lote: comparte el resultado del original
+            pedidos[(parsed["tenant_id"], parsed["order_id"])]["message_ids"].append(record["messageId"])
+            duplicados += 1
+            continue
+        if event_id:
+            vistos.add(event_id)
+        grupo = pedidos.setdefault(
+            (parsed["tenant_id"], parsed["order_id"]), {"events": [], "message_ids": []}
+        )
+        grupo["events"].append(parsed)
+        grupo["message_ids"].append(record["messageId"])
+
+    fallidos = []
+    registrados = 0
+    # Último evento registrado por pedido, agrupado por tenant (un fan-out por tenant)
+    push = {}
+    # Eventos a sumar en TenantStats y sus mensajes, por tenant
+    estadisticas = {}
+    for (tenant_id, order_id), grupo in pedidos.items():
+        try:
+            nuevos, repetidos = registrar_eventos(tenant_id, order_id, grupo["events"])
+        except PedidoInexistente:
+            print(f"Pedido {tenant_id}/{order_id} no existe: {len(grupo['events'])} eventos descartados")
+            descartados += len(grupo["events"])
+            continue
+        except Exception as e:
+            print(f"Error registrando eventos de {tenant_id}/{order_id}: {str(e)}")
+            fallidos.extend(grupo["message_ids"])
+            continue
+
+        registrados += len(nuevos)
+        duplicados += len(grupo["events"]) - len(nuevos)
+        # Los repetidos también: si su lote original falló al sumar, siguen con
+        # stats_pending y se cuentan ahora (una sola vez, ver aplicar_estadisticas)
+        contables = [e for e in nuevos + repetidos if e["event_type"] in STATUS_EVENTS]
+        if contables:
+            tenant_stats = estadisticas.setdefault(tenant_id, {"events": [], "message_ids": []})
+            tenant_stats["events"].extend(contables)
+            tenant_stats["message_ids"].extend(grupo["message_ids"])
+        if nuevos:
+            ultimo = max(nuevos, key=lambda e: str(e["detail"].get("event_time") or e["time"] or ""))
+            push.setdefault(tenant_id, {})[order_id] = status_message(ultimo["event_type"], ultimo["detail"])
+
+    for tenant_id, tenant_stats in estadisticas.items():
+        try:
+            aplicar_estadisticas(tenant_id, tenant_stats["events"])
+        except Exception as e:
+            # El historial ya quedó escrito con stats_pending: la redelivery solo suma
+            print(f"Error sumando estadísticas de {tenant_id}: {str(e)}")
+            fallidos.extend(tenant_stats["message_ids"])
+
+    for tenant_id, mensajes in push.items():
+        push_websocket(tenant_id, mensajes)
+
+    print(
+        f"Lote de {len(records)} mensajes: {len(pedidos)} pedidos, {registrados} eventos registrados, "
+        f"{duplicados} duplicados, {descartados} descartados, {len(fallidos)} con error"
+    )
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in fallidos]}
+
+
+def parse_record(record):
+    """
+    Evento de EventBridge del body del record, o None si no se puede procesar
+    (JSON inválido o sin detail-type / order_id / tenant_id: reintentar no lo arregla).
+    """
+    try:
+        eb_event = json.loads(record["body"])
+    except (KeyError, TypeError, json.JSONDecodeError):
+        print(f"Mensaje {record.get('messageId')} descartado: body no es JSON")
+        return None
+
+    detail = eb_event.get("detail") or {}
+    event_type = eb_event.get("detail-type")
+    order_id = detail.get("order_id")
+    tenant_id = detail.get("tenant_id")
+    if not event_type or not order_id or not tenant_id:
+        print(f"Mensaje {record.get('messageId')} descartado: faltan detail-type, detail.order_id o detail.tenant_id")
+        return None
+
+    return {
+        # Sin id (invocación directa) no hay deduplicación: id propio para el event_key
+        "id": eb_event.get("id") or uuid.uuid4().hex,
+        "time": eb_event.get("time"),
+        # timestamp estable entre redeliveries (forma parte del event_key)
+        "timestamp": detail.get("event_time") or eb_event.get("time") or datetime.now(timezone.utc).isoformat(),
+        "event_type": event_type,
+        "detail": detail,
+        "order_id": order_id,
+        "tenant_id": tenant_id,
+    }
+
+
+def history_entry_for(parsed, now):
+    detail = parsed["detail"]
+    timestamp = parsed["timestamp"]
+
+    history_entry = {
+        "event_type": parsed["event_type"],
+        "event_label": EVENT_LABELS.get(parsed["event_type"], parsed["event_type"]),
+        "timestamp": timestamp,
+        "event_time": detail.get("event_time", timestamp),
+        "received_at": now,
+        "order_id": parsed["order_id"],
+        "tenant_id": parsed["tenant_id"],
+        "status": detail.get("status"),          # casi todos los eventos ya lo envían
+        "customer_id": detail.get("customer_id"),
+        "staff_id": detail.get("staff_id"),
+        "staff_name": detail.get("staff_name"),
+        "reason": detail.get("reason"),
+        # EventBridge entrega números como float; DynamoDB solo acepta Decimal
+        "total": Decimal(str(detail["total"])) if detail.get("total") is not None else None,
+        # Marca de "falta sumar en TenantStats": la quita aplicar_estadisticas
+        "stats_pending": True if parsed["event_type"] in STATUS_EVENTS else None,
+    }
+
+    # Limpieza de None para no ensuciar el historial
+    return {k: v for k, v in history_entry.items() if v is not None}
+
+
+def registrar_eventos(tenant_id, order_id, events):
+    """
+    Registra los eventos de un pedido en una transacción por cada
+    MAX_EVENTS_PER_TRANSACTION (ver registrar_transaccion). Si falla una tanda,
+    las anteriores ya quedaron escritas: la redelivery las descarta por su id.
+    Devuelve (registrados, repetidos).
+    """
+    if any(e["event_type"] == "PedidoCancelado" for e in events):
+        previous_status = estado_anterior(tenant_id, order_id)
+        for e in events:
+            if e["event_type"] == "PedidoCancelado":
+                e["previous_status"] = previous_status
+
+    registrados, repetidos = [], []
+    for start in range(0, len(events), MAX_EVENTS_PER_TRANSACTION):
+        nuevos, ya_registrados = registrar_transaccion(
+            tenant_id, order_id, events[start:start + MAX_EVENTS_PER_TRANSACTION]
+        )
+        registrados += nuevos
+        repetidos += ya_registrados
+    return registrados, repetidos
+
+
+def registrar_transaccion(tenant_id, order_id, events):
+    """
+    Registra eventos de un pedido en una transacción:
+      - un Put de historial por evento (condicional por id de EventBridge),
+      - un Update del pedido con last_event_update (ETag de status/historial).
+    Si la transacción se cancela porque algún evento ya estaba registrado (redelivery
+    de otro lote), se quitan esos y se reintenta con el resto.
+    Devuelve (registrados, repetidos); lanza PedidoInexistente si el pedido no existe.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    pending, repetidos_total = list(events), []
+    while pending:
+        actions = [
+            history_put(tenant_id, order_id, history_entry_for(e, now),
+                        source=SOURCE_EVENTBRIDGE, event_id=e["id"])
+            for e in pending
+        ]
+        actions.append(last_event_update_action(tenant_id, order_id, now))
+
+        try:
+            dynamodb_client.transact_write_items(TransactItems=actions)
+            return pending, repetidos_total
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                raise
+            reasons = e.response.get("CancellationReasons") or []
+            if len(reasons) != len(actions):
+                raise
+
+        if reasons[-1].get("Code") == "ConditionalCheckFailed":
+            raise PedidoInexistente(f"{tenant_id}/{order_id}")
+
+        repetidos = {
+            i for i, reason in enumerate(reasons[:len(pending)])
+            if reason.get("Code") == "ConditionalCheckFailed"
+        }
+        if not repetidos:
+            raise RuntimeError(f"Transacción cancelada: {[r.get('Code') for r in reasons]}")
+        repetidos_total += [e for i, e in enumerate(pending) if i in repetidos]
+        pending = [e for i, e in enumerate(pending) if i not in repetidos]
+
+    return [], repetidos_total
+
+
+def aplicar_estadisticas(tenant_id, events):
+    """
+    Suma en TenantStats los eventos de un tenant del lote: una transacción por cada
+    MAX_EVENTS_PER_TRANSACTION con un Update por item (ALL y cada día, deltas
+    sumados) y, por evento, el Update que quita stats_pending de su entrada de
+    historial (condicional: un evento ya contado cancela la transacción, se quita
+    y se reintenta con el resto). Los TransactionConflict sobre el item ALL
+    (otra invocación a la vez) se reintentan con backoff.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    for start in range(0, len(events), MAX_EVENTS_PER_TRANSACTION):
+        pending = events[start:start + MAX_EVENTS_PER_TRANSACTION]
+        attempt = 0
+        while pending:
+            actions = [stats_counted_action(tenant_id, e) for e in pending]
+            actions += stats_batch_update_actions(
+                tenant_id,
+                [(e["event_type"], e["detail"], e.get("previous_status")) for e in pending],
+                now,
+            )
+            try:
+                dynamodb_client.transact_write_items(TransactItems=actions)
+                break
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                    raise
+                reasons = e.response.get("CancellationReasons") or []
+
+            codes = [reason.get("Code") for reason in reasons]
+            contados = {i for i, code in enumerate(codes[:len(pending)]) if code == "ConditionalCheckFailed"}
+            if contados:
+                pending = [e for i, e in enumerate(pending) if i not in contados]
+                continue
+            attempt += 1
+            if "TransactionConflict" not in codes or attempt >= STATS_MAX_ATTEMPTS:
+                raise RuntimeError(f"Transacción de estadísticas cancelada: {codes}")
+            time.sleep(min(0.05 * (2 ** attempt), 1))
+
+
+def stats_counted_action(tenant_id, parsed):
+    """Quita stats_pending de la entrada de historial del evento (solo si sigue pendiente)."""
+    return {
+        "Update": {
+            "TableName": ORDER_HISTORY_TABLE,
+            "Key": aws.to_dynamo_item({
+                "order_key": order_history_key(tenant_id, parsed["order_id"]),
+                "event_key": history_event_key(parsed["timestamp"], parsed["id"]),
+            }),
+            "UpdateExpression": "REMOVE stats_pending",
+            "ConditionExpression": "attribute_exists(stats_pending)",
+        }
+    }
+
+
+def push_websocket(tenant_id, mensajes):
+    """
+    Push del último evento de cada pedido del lote ({order_id: mensaje}) a los
+    suscriptores del tenant y de cada pedido: reemplaza el polling de clientes y
+    tablets. Un fallo aquí no reprocesa el lote (historial y contadores ya escritos).
+    """
+    if ws_api is None:
+        return
+    try:
+        fan_out_tenant(connection_store, ws_api, tenant_id, mensajes)
+    except Exception as e:
+        print(f"Error en push WebSocket de {tenant_id}: {str(e)}")
+
+
+def last_event_update_action(tenant_id, order_id, now):
+    """Update del pedido (solo si existe: no se crean pedidos fantasma desde eventos)."""
+    return {
+        "Update": {
+            "TableName": ORDERS_TABLE,
+            "Key": aws.to_dynamo_item({"tenant_id": tenant_id, "order_id": order_id}),
+            "UpdateExpression": "SET last_event_update = :now",
+            "ConditionExpression": "attribute_exists(order_id)",
+            "ExpressionAttributeValues": aws.to_dynamo_item({":now": now}),
+        }
+    }
+
+
+def estado_anterior(tenant_id, order_id):
+    """
+    Estado del que salió un pedido cancelado: la última entrada del flujo antes
+    de CANCELADO (el evento PedidoCancelado no lo trae). Query del más nuevo al más
+    viejo con el filtro en DynamoDB (solo entradas del flujo con estado distinto
+    de CANCELADO), siguiendo las páginas hasta encontrarla: los eventos de
+    EventBridge más nuevos no la dejan fuera. Solo para cancelaciones.
+    """
+    query_kwargs = {
+        "KeyConditionExpression": Key("order_key").eq(order_history_key(tenant_id, order_id)),
+        "FilterExpression": Attr("source").eq(SOURCE_WORKFLOW) & Attr("status").ne("CANCELADO") & Attr("status").exists(),
+        "ProjectionExpression": "#st",
+        "ExpressionAttributeNames": {"#st": "status"},
+        "ScanIndexForward": False,
+        "Limit": 25,
+    }
+    while True:
+        resp = history_table.query(**query_kwargs)
+        items = resp.get("Items", [])
+        if items:
+            return items[0]["status"]
+        if "LastEvaluatedKey" not in resp:
+            return None
+        query_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
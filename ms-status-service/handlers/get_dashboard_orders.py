@@ -1,152 +1,365 @@
-import json
-import os
-import boto3
-from boto3.dynamodb.conditions import Key
-from datetime import datetime, timezone
-from decimal import Decimal
-from collections import Counter
-from utils import response
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(os.environ["ORDERS_TABLE"])
-
-# Estados del flujo único
-VALID_STATUSES = [
-    "PENDIENTE",
-    "COCINANDO",
-    "EMPACANDO",
-    "EN_REPARTO",
-    "ENTREGADO",
-    "CANCELADO"
-]
-
-def lambda_handler(event, context):
-    print(f"Request: {json.dumps(event)}")
-
-    try:
-        # -------- tenant obligatorio ----------
-        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
-        if not tenant_id:
-            return response(400, {"error": "x-tenant-id header es requerido"})
-            
-
-        params = event.get("queryStringParameters", {}) or {}
-        status_filter = params.get("status")
-
-        pedidos = []
-
-        # -------- cuando viene status, query directa ----------
-        if status_filter:
-            if status_filter not in VALID_STATUSES:
-                return response(400, {"error": f"status inválido. Válidos: {', '.join(VALID_STATUSES)}"})
-
-            resp = table.query(
-                IndexName="StatusIndex",
-                KeyConditionExpression=
-                    Key("tenant_id").eq(tenant_id) & Key("status").eq(status_filter),
-                ScanIndexForward=True
-            )
-            pedidos = resp.get("Items", [])
-
-        # -------- sin status: queries por estado ----------
-        else:
-            for st in VALID_STATUSES:
-                resp = table.query(
-                    IndexName="StatusIndex",
-                    KeyConditionExpression=
-                        Key("tenant_id").eq(tenant_id) & Key("status").eq(st),
-                    ScanIndexForward=True
-                )
-                pedidos.extend(resp.get("Items", []))
-
-        pedidos_formateados = [
-            {
-                "order_id": p.get("order_id"),
-                "tenant_id": p.get("tenant_id"),
-                "customer_id": p.get("customer_id"),
-                "status": p.get("status"),
-                "items": clean_decimals(p.get("items", [])),
-                "total": float(p.get("total", 0)),
-                "created_at": p.get("created_at"),
-                "updated_at": p.get("updated_at"),
-                "tiempo_espera_minutos": calcular_tiempo_espera(p.get("created_at")),
-                "pasos_completados": contar_pasos(p.get("history", []))
-            }
-            for p in pedidos
-        ]
-
-        pedidos_formateados.sort(key=lambda x: x["created_at"] or "")
-
-        estadisticas = generar_estadisticas_dashboard(pedidos_formateados)
-        return response(200, {"tenant_id": tenant_id,
-                "orders": pedidos_formateados,
-                "statistics": estadisticas,
-                "total": len(pedidos_formateados),
-                "filter_applied": status_filter})
-        
-
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        return response(500, {"error": str(e)})
-        
-
-
-def calcular_tiempo_espera(created_at):
-    if not created_at:
-        return 0
-
-    try:
-        fecha_pedido = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-        ahora = datetime.now(fecha_pedido.tzinfo)
-        diferencia = (ahora - fecha_pedido).total_seconds() / 60
-        return round(diferencia, 1)
-    except:
-        return 0
-
-
-def contar_pasos(history):
-    """
-    En tu flujo nuevo, cada UpdateOrderStatusStep agrega entradas
-    con action = INIT/COOKING/PACKING/ON_DELIVERY/DELIVERED
-    Así contamos pasos reales (excepto INIT si no quieres contarlo).
-    """
-    acciones_flujo = {"INIT", "COOKING", "PACKING", "ON_DELIVERY", "DELIVERED"}
-    return len([h for h in history if h.get("action") in acciones_flujo])
-
-
-def generar_estadisticas_dashboard(pedidos):
-    if not pedidos:
-        return {
-            "total_pedidos": 0,
-            "por_estado": {},
-            "tiempo_espera_promedio": 0,
-            "pedido_mas_antiguo_minutos": 0,
-            "total_ventas": 0,
-            "estados_disponibles": VALID_STATUSES
-        }
-
-    estados = Counter(p["status"] for p in pedidos)
-
-    tiempos_espera = [p["tiempo_espera_minutos"] for p in pedidos]
-    tiempo_promedio = sum(tiempos_espera) / len(tiempos_espera) if tiempos_espera else 0
-    pedido_mas_antiguo = max(tiempos_espera) if tiempos_espera else 0
-
-    total_ventas = sum(p["total"] for p in pedidos)
-
-    return {
-        "total_pedidos": len(pedidos),
-        "por_estado": dict(estados),
-        "tiempo_espera_promedio": round(tiempo_promedio, 1),
-        "pedido_mas_antiguo_minutos": round(pedido_mas_antiguo, 1),
-        "total_ventas": round(total_ventas, 2),
-        "estados_disponibles": VALID_STATUSES
-    }
-
-
-def clean_decimals(obj):
-    if isinstance(obj, list):
-        return [clean_decimals(i) for i in obj]
-    if isinstance(obj, dict):
-        return {k: clean_decimals(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    return obj
+import json
+import os
+from boto3.dynamodb.conditions import Key
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from collections import Counter
+from chinawok_common import (
+    aws, response, parse_limit, encode_cursor, decode_cursor,
+    tenant_stats_table_name, STATS_KEY_ALL, stats_day_key,
+)
+table = aws.lazy_table(os.environ["ORDERS_TABLE"])
+stats_table = aws.lazy_table(tenant_stats_table_name())
+
+# Tope de pedidos leídos por estado (se siguen las páginas hasta llegar aquí)
+DASHBOARD_MAX_ORDERS_PER_STATUS = int(os.environ.get("DASHBOARD_MAX_ORDERS_PER_STATUS", "1000"))
+
+# Solo los campos que muestra el dashboard (sin history ni tokens del flujo)
+DASHBOARD_PROJECTION = (
+    "order_id, tenant_id, customer_id, #st, #items, #total, "
+    "created_at, updated_at, steps_completed"
+)
+DASHBOARD_ATTRIBUTE_NAMES = {"#st": "status", "#items": "items", "#total": "total"}
+
+# Estados del flujo único
+VALID_STATUSES = [
+    "PENDIENTE",
+    "COCINANDO",
+    "EMPACANDO",
+    "EN_REPARTO",
+    "ENTREGADO",
+    "CANCELADO"
+]
+
+# Un pedido en estado final sale del tablero (en modo ?since= llega como tombstone)
+FINAL_STATUSES = {"ENTREGADO", "CANCELADO"}
+
+# Estados que muestra el tablero sin ?status: el snapshot completo y el modo
+# incremental usan el mismo conjunto
+ACTIVE_STATUSES = [st for st in VALID_STATUSES if st not in FINAL_STATUSES]
+
+# Margen hacia atrás sobre `since`: cubre escrituras con updated_at apenas anterior
+# al cursor que el GSI (eventualmente consistente) todavía no mostraba. Los
+# repetidos no molestan: el cliente hace merge por order_id.
+DASHBOARD_SINCE_OVERLAP_SECONDS = int(os.environ.get("DASHBOARD_SINCE_OVERLAP_SECONDS", "5"))
+
+def lambda_handler(event, context):
+    print(f"Request: {json.dumps(event)}")
+
+    try:
+        # -------- tenant obligatorio ----------
+        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
+        if not tenant_id:
+            return response(400, {"error": "x-tenant-id header es requerido"})
+            
+
+        params = event.get("queryStringParameters", {}) or {}
+        status_filter = params.get("status")
+
+        # -------- estadísticas: item ALL (o el del día pedido) de TenantStats ----------
+        stats_day = params.get("stats_day")
+        if stats_day:
+            try:
+                datetime.strptime(stats_day, "%Y-%m-%d")
+            except ValueError:
+                return response(400, {"error": "stats_day debe ser YYYY-MM-DD"})
+        stats_key = stats_day_key(stats_day) if stats_day else STATS_KEY_ALL
+
+        if status_filter and status_filter not in VALID_STATUSES:
+            return response(400, {"error": f"status inválido. Válidos: {', '.join(VALID_STATUSES)}"})
+
+        # -------- modo incremental: solo lo que cambió desde el cursor ----------
+        if params.get("since"):
+            return dashboard_incremental(tenant_id, params, status_filter, stats_key)
+
+        # -------- cuando viene status, query directa ----------
+        if status_filter:
+            estados = [status_filter]
+
+        # -------- sin status: una query por estado activo, en paralelo ----------
+        else:
+            estados = ACTIVE_STATUSES
+
+        # Las queries y el get_item de estadísticas corren a la vez
+        with ThreadPoolExecutor(max_workers=len(estados) + 1) as pool:
+            stats_future = pool.submit(leer_estadisticas, tenant_id, stats_key)
+            resultados = list(pool.map(lambda st: query_estado(tenant_id, st), estados))
+            stats_item = stats_future.result()
+
+        pedidos = []
+        truncados = []
+        for st, (items, truncado) in zip(estados, resultados):
+            pedidos.extend(items)
+            if truncado:
+                truncados.append(st)
+
+        pedidos_formateados = [formatear_pedido(p) for p in pedidos]
+
+        pedidos_formateados.sort(key=lambda x: x["created_at"] or "")
+
+        if stats_item is not None:
+            estadisticas = estadisticas_desde_item(stats_item)
+        else:
+            # Tenant sin agregados todavía (anterior a TenantStats): se calculan sobre
+            # todos sus pedidos, como el item ALL. La lista del tablero solo trae los
+            # estados pedidos: se leen los que faltan (finales incluidos), solo aquí.
+            faltantes = [st for st in VALID_STATUSES if st not in estados]
+            with ThreadPoolExecutor(max_workers=len(faltantes) or 1) as pool:
+                resto = list(pool.map(lambda st: query_estado(tenant_id, st)[0], faltantes))
+            todos = pedidos_formateados + [formatear_pedido(p) for items in resto for p in items]
+            estadisticas = generar_estadisticas_dashboard(todos)
+        return response(200, {"tenant_id": tenant_id,
+                "orders": pedidos_formateados,
+                "statistics": estadisticas,
+                "total": len(pedidos_formateados),
+                "filter_applied": status_filter,
+                # Estados que superaron DASHBOARD_MAX_ORDERS_PER_STATUS (lista parcial)
+                "truncated": bool(truncados),
+                "truncated_statuses": truncados})
+        
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return response(500, {"error": str(e)})
+        
+
+
+def dashboard_incremental(tenant_id, params, status_filter, stats_key):
+    """
+    GET /status/dashboard?since=<updated_at>[&cursor=...][&limit=...]
+
+    Query a UpdatedIndex (tenant_id + updated_at): devuelve solo los pedidos
+    creados o modificados desde `since`. Los que salieron del tablero (estado
+    final, o distinto del filtro `status`) vienen en `removed` como tombstones.
+    El cliente guarda `next_since` y lo manda en el siguiente poll; si
+    `next_cursor` no es null, hay más cambios para el mismo `since`.
+    """
+    since = params["since"]
+    try:
+        since_dt = datetime.fromisoformat(since.replace("Z", "+00:00"))
+        if since_dt.tzinfo is None:
+            since_dt = since_dt.replace(tzinfo=timezone.utc)
+        limit = parse_limit(params)
+        start_key = decode_cursor(params.get("cursor"))
+    except ValueError:
+        return response(400, {"error": "since, limit o cursor inválido"})
+
+    if start_key and start_key.get("tenant_id") != tenant_id:
+        return response(400, {"error": "since, limit o cursor inválido"})
+
+    desde = (since_dt - timedelta(seconds=DASHBOARD_SINCE_OVERLAP_SECONDS)).isoformat()
+    query_kwargs = {
+        "IndexName": "UpdatedIndex",
+        "KeyConditionExpression": Key("tenant_id").eq(tenant_id) & Key("updated_at").gte(desde),
+        "ProjectionExpression": DASHBOARD_PROJECTION,
+        "ExpressionAttributeNames": DASHBOARD_ATTRIBUTE_NAMES,
+        "ScanIndexForward": True,
+        "Limit": limit,
+    }
+    if start_key:
+        query_kwargs["ExclusiveStartKey"] = start_key
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        stats_future = pool.submit(leer_estadisticas, tenant_id, stats_key)
+        resp = table.query(**query_kwargs)
+        stats_item = stats_future.result()
+
+    pedidos, removidos = [], []
+    next_since = since_dt.isoformat()
+    for p in resp.get("Items", []):
+        next_since = max(next_since, p.get("updated_at") or "")
+        en_tablero = p.get("status") == status_filter if status_filter else p.get("status") in ACTIVE_STATUSES
+        if en_tablero:
+            pedidos.append(formatear_pedido(p))
+        else:
+            removidos.append({
+                "order_id": p.get("order_id"),
+                "status": p.get("status"),
+                "updated_at": p.get("updated_at"),
+            })
+
+    return response(200, {
+        "tenant_id": tenant_id,
+        "orders": pedidos,
+        "removed": removidos,
+        "statistics": estadisticas_desde_item(stats_item) if stats_item else None,
+        "total": len(pedidos),
+        "filter_applied": status_filter,
+        "since": since,
+        "next_since": next_since,
+        "next_cursor": encode_cursor(resp.get("LastEvaluatedKey")),
+    })
+
+
+def formatear_pedido(p):
+    return {
+        "order_id": p.get("order_id"),
+        "tenant_id": p.get("tenant_id"),
+        "customer_id": p.get("customer_id"),
+        "status": p.get("status"),
+        "items": p.get("items", []),
+        "total": float(p.get("total", 0)),
+        "created_at": p.get("created_at"),
+        "updated_at": p.get("updated_at"),
+        "tiempo_espera_minutos": calcular_tiempo_espera(p.get("created_at")),
+        "pasos_completados": contar_pasos(p)
+    }
+
+
+def query_estado(tenant_id, status):
+    """
+    Pedidos del tenant en un estado (StatusCreatedIndex), siguiendo LastEvaluatedKey
+    hasta DASHBOARD_MAX_ORDERS_PER_STATUS. Devuelve (items, truncado).
+    """
+    items = []
+    query_kwargs = {
+        "IndexName": "StatusCreatedIndex",
+        "KeyConditionExpression":
+            Key("tenant_id").eq(tenant_id)
+            & Key("status_created").begins_with(f"{status}#"),
+        "ProjectionExpression": DASHBOARD_PROJECTION,
+        "ExpressionAttributeNames": DASHBOARD_ATTRIBUTE_NAMES,
+        "ScanIndexForward": True,
+    }
+    while True:
+        query_kwargs["Limit"] = DASHBOARD_MAX_ORDERS_PER_STATUS - len(items)
+        resp = table.query(**query_kwargs)
+        items.extend(resp.get("Items", []))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            return items, False
+        if len(items) >= DASHBOARD_MAX_ORDERS_PER_STATUS:
+            print(f"Dashboard {tenant_id}: {status} truncado en {len(items)} pedidos")
+            return items, True
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+
+def leer_estadisticas(tenant_id, stats_key):
+    """Un get_item a TenantStats, lo mantiene el event listener con ADD atómicos."""
+    resp = stats_table.get_item(Key={"tenant_id": tenant_id, "stats_key": stats_key})
+    return resp.get("Item")
+
+
+def estadisticas_desde_item(item):
+    """
+    Mismo bloque que generar_estadisticas_dashboard, a partir de los contadores:
+    espera promedio = ahora - promedio(created_at), sin leer ningún pedido.
+    """
+    ahora = datetime.now(timezone.utc).timestamp()
+    recibidos = int(item.get("recibidos", 0))
+    entregados = int(item.get("entregados", 0))
+
+    tiempo_promedio = 0
+    if recibidos and item.get("created_epoch_sum") is not None:
+        tiempo_promedio = (ahora - float(item["created_epoch_sum"]) / recibidos) / 60
+
+    pedido_mas_antiguo = 0
+    if item.get("primer_pedido_epoch") is not None:
+        pedido_mas_antiguo = (ahora - float(item["primer_pedido_epoch"])) / 60
+
+    tiempo_entrega = 0
+    if entregados:
+        tiempo_entrega = float(item.get("entrega_segundos_total", 0)) / entregados / 60
+
+    return {
+        "total_pedidos": recibidos,
+        "por_estado": {
+            st: int(item[f"estado_{st}"])
+            for st in VALID_STATUSES
+            if item.get(f"estado_{st}")
+        },
+        "tiempo_espera_promedio": round(tiempo_promedio, 1),
+        "pedido_mas_antiguo_minutos": round(pedido_mas_antiguo, 1),
+        "total_ventas": round(float(item.get("ventas", 0)), 2),
+        "entregados": entregados,
+        "cancelados": int(item.get("cancelados", 0)),
+        "tiempo_entrega_promedio": round(tiempo_entrega, 1),
+        "estados_disponibles": VALID_STATUSES,
+        "actualizado": item.get("updated_at"),
+    }
+
+
+def calcular_tiempo_espera(created_at):
+    if not created_at:
+        return 0
+
+    try:
+        fecha_pedido = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+        ahora = datetime.now(fecha_pedido.tzinfo)
+        diferencia = (ahora - fecha_pedido).total_seconds() / 60
+        return round(diferencia, 1)
+    except:
+        return 0
+
+
+# Pasos del flujo completados al llegar a cada estado (pedidos sin steps_completed):
+# el 1 de CreateOrder más una transición del flujo por estado, empezando por INIT
+# (PENDIENTE = 2), igual que el steps_completed que deja el flujo
+PASOS_POR_ESTADO = {"PENDIENTE": 2, "COCINANDO": 3, "EMPACANDO": 4, "EN_REPARTO": 5, "ENTREGADO": 6}
+
+
+def contar_pasos(pedido):
+    """
+    CreateOrder guarda steps_completed = 1 (INIT del pedido) y cada transición
+    del flujo (INIT de cumplimiento incluido) le suma 1, así no hace falta leer
+    el historial. Los pedidos anteriores a steps_completed se estiman por su estado.
+    """
+    if "steps_completed" in pedido:
+        return int(pedido["steps_completed"])
+    return PASOS_POR_ESTADO.get(pedido.get("status"), 0)
+
+
+def generar_estadisticas_dashboard(pedidos):
+    """
+    Estadísticas sobre pedidos ya leídos (tenants sin item ALL en TenantStats).
+    Recibe todos los pedidos del tenant y devuelve el mismo bloque que
+    estadisticas_desde_item; la entrega se mide hasta updated_at del ENTREGADO.
+    """
+    if not pedidos:
+        return {
+            "total_pedidos": 0,
+            "por_estado": {},
+            "tiempo_espera_promedio": 0,
+            "pedido_mas_antiguo_minutos": 0,
+            "total_ventas": 0,
+            "entregados": 0,
+            "cancelados": 0,
+            "tiempo_entrega_promedio": 0,
+            "estados_disponibles": VALID_STATUSES,
+            "actualizado": None,
+        }
+
+    estados = Counter(p["status"] for p in pedidos)
+
+    tiempos_espera = [p["tiempo_espera_minutos"] for p in pedidos]
+    tiempo_promedio = sum(tiempos_espera) / len(tiempos_espera) if tiempos_espera else 0
+    pedido_mas_antiguo = max(tiempos_espera) if tiempos_espera else 0
+
+    total_ventas = sum(p["total"] for p in pedidos)
+
+    entregas = [minutos_entre(p["created_at"], p["updated_at"]) for p in pedidos if p["status"] == "ENTREGADO"]
+    entregas = [m for m in entregas if m is not None]
+    tiempo_entrega = sum(entregas) / len(entregas) if entregas else 0
+
+    return {
+        "total_pedidos": len(pedidos),
+        "por_estado": dict(estados),
+        "tiempo_espera_promedio": round(tiempo_promedio, 1),
+        "pedido_mas_antiguo_minutos": round(pedido_mas_antiguo, 1),
+        "total_ventas": round(total_ventas, 2),
+        "entregados": estados.get("ENTREGADO", 0),
+        "cancelados": estados.get("CANCELADO", 0),
+        "tiempo_entrega_promedio": round(tiempo_entrega, 1),
+        "estados_disponibles": VALID_STATUSES,
+        "actualizado": None,
+    }
+
+
+def minutos_entre(inicio, fin):
+    if not inicio or not fin:
+        return None
+    try:
+        delta = datetime.fromisoformat(fin.replace("Z", "+00:00")) - datetime.fromisoformat(inicio.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(delta.total_seconds(), 0) / 60
@@ -1,134 +1,332 @@
-import json
-import os
-import boto3
-from datetime import datetime
-from decimal import Decimal
-from utils import response
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(os.environ["ORDERS_TABLE"])
-
-# Acciones reales del flujo único
-FLOW_ACTIONS = {"INIT", "COOKING", "PACKING", "ON_DELIVERY", "DELIVERED"}
-
-def lambda_handler(event, context):
-    print(f"Request: {json.dumps(event)}")
-
-    try:
-        # -------- tenant obligatorio ----------
-        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
-        if not tenant_id:
-            return response(400, {"error": "x-tenant-id header es requerido"})
-            
-
-        order_id = (event.get("pathParameters") or {}).get("order_id")
-        if not order_id:
-            return response(400,{"error": "order_id es requerido"})
-            
-
-        # -------- get pedido con PK compuesta ----------
-        resp = table.get_item(Key={"tenant_id": tenant_id, "order_id": order_id})
-
-        if "Item" not in resp:
-            return response(404, {"error": "Pedido no encontrado"})
-            
-
-        pedido = resp["Item"]
-
-        history_original = pedido.get("history", [])
-        event_history = pedido.get("event_history", [])
-
-        timeline = construir_timeline(history_original, event_history)
-        estadisticas = calcular_estadisticas(timeline, pedido)
-
-        resultado = {
-            "order_id": order_id,
-            "tenant_id": tenant_id,
-            "customer_id": pedido.get("customer_id"),
-            "status": pedido.get("status"),
-            "items": clean_decimals(pedido.get("items", [])),
-            "total": float(pedido.get("total", 0)),
-            "created_at": pedido.get("created_at"),
-            "updated_at": pedido.get("updated_at"),
-            "timeline": timeline,
-            "statistics": estadisticas
-        }
-
-        return response(200,{resultado})
-
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        return response(500,{"error": str(e)})
-        
-
-
-def construir_timeline(history_original, event_history):
-    timeline = []
-
-    # 1) Historial del flujo (lo escribe Orders + Fulfillment)
-    for entry in history_original:
-        timeline.append({
-            "timestamp": entry.get("at") or entry.get("timestamp"),
-            "action": entry.get("action"),
-            "status": entry.get("status"),
-            "by": entry.get("by") or entry.get("staff_id"),
-            "staff_name": entry.get("staff_name"),
-            "reason": entry.get("reason", ""),
-            "source": "workflow"
-        })
-
-    # 2) Historial de eventos (lo escribe Status Listener)
-    for entry in event_history:
-        timeline.append({
-            "timestamp": entry.get("timestamp"),
-            "event_type": entry.get("event_type"),
-            "event_label": entry.get("event_label"),
-            "status": entry.get("status"),
-            "details": {k: v for k, v in entry.items() if k not in ["timestamp", "event_type", "event_label"]},
-            "source": "eventbridge"
-        })
-
-    timeline.sort(key=lambda x: x.get("timestamp", ""))
-    return timeline
-
-
-def calcular_estadisticas(timeline, pedido):
-    if not timeline:
-        return {}
-
-    try:
-        created_at = pedido.get("created_at")
-        updated_at = pedido.get("updated_at")
-
-        if created_at and updated_at:
-            inicio = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-            fin = datetime.fromisoformat(updated_at.replace("Z", "+00:00"))
-            tiempo_total = (fin - inicio).total_seconds() / 60
-        else:
-            tiempo_total = 0
-
-        # pasos del flujo único
-        pasos_completados = len([
-            e for e in timeline
-            if e.get("action") in FLOW_ACTIONS
-        ])
-
-        return {
-            "tiempo_total_minutos": round(tiempo_total, 2),
-            "eventos_totales": len(timeline),
-            "pasos_completados": pasos_completados,
-            "estado_actual": pedido.get("status")
-        }
-
-    except Exception as e:
-        print(f"Error calculando estadísticas: {str(e)}")
-        return response(500, {"error": "No se pudieron calcular estadísticas"})
-
-
-def clean_decimals(obj):
-    if isinstance(obj, list):
-        return [clean_decimals(i) for i in obj]
-    if isinstance(obj, dict):
-        return {k: clean_decimals(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    return obj
+import heapq
+import json
+import os
+from boto3.dynamodb.conditions import Attr, Key
+from datetime import datetime
+from chinawok_common import (
+    aws, response, order_history_key, etag_for, etag_matches, if_none_match, not_modified,
+    parse_limit, encode_cursor, decode_cursor, TTLCache, SOURCE_EVENTBRIDGE, SOURCE_WORKFLOW,
+)
+table = aws.lazy_table(os.environ["ORDERS_TABLE"])
+history_table = aws.lazy_table(os.environ["ORDER_HISTORY_TABLE"])
+
+# Caché por contenedor del timeline (mismo ETag que get_order_status)
+HISTORY_CACHE_TTL_SECONDS = float(os.environ.get("HISTORY_CACHE_TTL_SECONDS", "2"))
+HISTORY_CACHE_MAX_ENTRIES = int(os.environ.get("HISTORY_CACHE_MAX_ENTRIES", "500"))
+history_cache = TTLCache(HISTORY_CACHE_TTL_SECONDS, HISTORY_CACHE_MAX_ENTRIES)
+
+VERSION_PROJECTION = "updated_at, last_event_update"
+
+# Página del timeline (?limit=)
+HISTORY_DEFAULT_LIMIT = int(os.environ.get("HISTORY_DEFAULT_LIMIT", "100"))
+HISTORY_MAX_LIMIT = int(os.environ.get("HISTORY_MAX_LIMIT", "500"))
+
+# Acciones reales del flujo único
+FLOW_ACTIONS = {"INIT", "COOKING", "PACKING", "ON_DELIVERY", "DELIVERED"}
+
+# Campos que no se repiten dentro de "details" de un evento
+HISTORY_META_FIELDS = {"timestamp", "event_type", "event_label", "order_key", "event_key", "source", "stats_pending"}
+
+# Campos del timeline que se pueden pedir con ?fields= -> atributos de OrderHistoryTable.
+# timestamp y source van siempre. "details" necesita el item completo (sin proyección).
+TIMELINE_FIELDS = {
+    "action": ("action",),
+    "status": ("status",),
+    "by": ("by", "staff_id"),
+    "staff_name": ("staff_name",),
+    "reason": ("reason",),
+    "event_type": ("event_type",),
+    "event_label": ("event_label",),
+    "details": None,
+}
+# Atributos que el merge y el cursor necesitan siempre
+HISTORY_KEY_ATTRIBUTES = ("event_key", "timestamp", "source")
+
+def lambda_handler(event, context):
+    print(f"Request: {json.dumps(event)}")
+
+    try:
+        # -------- tenant obligatorio ----------
+        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
+        if not tenant_id:
+            return response(400, {"error": "x-tenant-id header es requerido"})
+            
+
+        order_id = (event.get("pathParameters") or {}).get("order_id")
+        if not order_id:
+            return response(400,{"error": "order_id es requerido"})
+            
+
+        # -------- paginación y filtros: limit, cursor, source, fields ----------
+        params = event.get("queryStringParameters") or {}
+        try:
+            limit = parse_limit(params, default=HISTORY_DEFAULT_LIMIT, maximum=HISTORY_MAX_LIMIT)
+            cursor = decode_cursor(params.get("cursor"))
+        except ValueError:
+            return response(400, {"error": "limit o cursor inválido"})
+        if cursor is not None and not isinstance(cursor.get("ts"), str):
+            return response(400, {"error": "limit o cursor inválido"})
+
+        source = params.get("source") or None
+        if source not in (None, SOURCE_WORKFLOW, SOURCE_EVENTBRIDGE):
+            return response(400, {"error": "source inválido",
+                    "valid_sources": [SOURCE_WORKFLOW, SOURCE_EVENTBRIDGE]})
+
+        fields = parse_fields(params.get("fields"))
+        if fields is not None:
+            invalidos = sorted(fields - TIMELINE_FIELDS.keys())
+            if invalidos:
+                return response(400, {"error": f"fields inválidos: {', '.join(invalidos)}",
+                        "valid_fields": sorted(TIMELINE_FIELDS)})
+
+        key = {"tenant_id": tenant_id, "order_id": order_id}
+        # Cada combinación de parámetros es una página distinta (caché y ETag propios)
+        variante = (limit, params.get("cursor") or "", source or "",
+                    ",".join(sorted(fields)) if fields is not None else "")
+        cache_key = (tenant_id, order_id, variante)
+        etags_cliente = if_none_match(event)
+
+        # -------- caché del contenedor ----------
+        # (resultado None: solo se conoce el ETag, de un 304 anterior)
+        cached = history_cache.get(cache_key)
+        if cached:
+            etag, resultado = cached
+            if etag_matches(etags_cliente, etag):
+                return not_modified(etag)
+            if resultado is not None:
+                return response(200, resultado, headers={"ETag": etag})
+
+        # -------- If-None-Match: se evita leer el historial si no cambió ----------
+        if etags_cliente:
+            resp = table.get_item(Key=key, ProjectionExpression=VERSION_PROJECTION)
+            if "Item" not in resp:
+                return response(404, {"error": "Pedido no encontrado"})
+            etag = pedido_etag(resp["Item"], variante)
+            if etag_matches(etags_cliente, etag):
+                history_cache.put(cache_key, (etag, None))
+                return not_modified(etag)
+
+        # -------- get pedido con PK compuesta ----------
+        # history/event_history solo existen en pedidos anteriores a OrderHistoryTable:
+        # se proyectan solo las listas del source pedido
+        legacy = [
+            attr for attr, src in (("history", SOURCE_WORKFLOW), ("event_history", SOURCE_EVENTBRIDGE))
+            if source in (None, src)
+        ]
+        resp = table.get_item(
+            Key=key,
+            ProjectionExpression=", ".join([
+                "customer_id", "#st", "#items", "#total", "created_at", "updated_at",
+                "last_event_update", "steps_completed", *legacy,
+            ]),
+            ExpressionAttributeNames={"#st": "status", "#items": "items", "#total": "total"},
+        )
+
+        if "Item" not in resp:
+            return response(404, {"error": "Pedido no encontrado"})
+            
+
+        pedido = resp["Item"]
+
+        # -------- timeline: merge de los historiales, ya en orden cronológico ----------
+        timeline, siguiente = construir_timeline(
+            pedido.get("history", []) if "history" in legacy else [],
+            pedido.get("event_history", []) if "event_history" in legacy else [],
+            leer_historial(tenant_id, order_id, source, fields, cursor, limit),
+            limit,
+            cursor,
+            fields,
+        )
+        estadisticas = calcular_estadisticas(timeline, pedido, completo=cursor is None and siguiente is None)
+
+        resultado = {
+            "order_id": order_id,
+            "tenant_id": tenant_id,
+            "customer_id": pedido.get("customer_id"),
+            "status": pedido.get("status"),
+            "items": pedido.get("items", []),
+            "total": float(pedido.get("total", 0)),
+            "created_at": pedido.get("created_at"),
+            "updated_at": pedido.get("updated_at"),
+            "timeline": timeline,
+            "next_cursor": encode_cursor(siguiente),
+            "statistics": estadisticas
+        }
+
+        etag = pedido_etag(pedido, variante)
+        history_cache.put(cache_key, (etag, resultado))
+        return response(200, resultado, headers={"ETag": etag})
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return response(500,{"error": str(e)})
+        
+
+
+def parse_fields(raw):
+    """?fields=status,by -> {"status", "by"}; None si no se pide proyección."""
+    if not raw:
+        return None
+    return {f.strip() for f in raw.split(",") if f.strip()}
+
+
+def pedido_etag(pedido, variante):
+    return etag_for(pedido.get("updated_at"), pedido.get("last_event_update"), *variante)
+
+
+def history_attributes(fields):
+    """Atributos a proyectar en OrderHistoryTable, o None si hace falta el item completo."""
+    if fields is None or "details" in fields:
+        return None
+    attrs = set(HISTORY_KEY_ATTRIBUTES)
+    for field in fields:
+        attrs.update(TIMELINE_FIELDS[field])
+    return sorted(attrs)
+
+
+def leer_historial(tenant_id, order_id, source=None, fields=None, cursor=None, limit=None):
+    """
+    Items de historial del pedido, en orden cronológico (sort key timestamp#sufijo).
+    Generador: pagina en DynamoDB solo mientras el timeline siga pidiendo entradas.
+    """
+    key_condition = Key("order_key").eq(order_history_key(tenant_id, order_id))
+    if cursor is not None:
+        # event_key empieza con el timestamp: se retoma desde el del cursor
+        key_condition = key_condition & Key("event_key").gte(cursor["ts"])
+
+    kwargs = {"KeyConditionExpression": key_condition}
+    if source is not None:
+        kwargs["FilterExpression"] = Attr("source").eq(source)
+    elif limit is not None:
+        # Sin filtro cada item leído entra al timeline: una página + 1 para saber si hay más
+        kwargs["Limit"] = limit + 1
+
+    attrs = history_attributes(fields)
+    if attrs is not None:
+        names = {f"#a{i}": attr for i, attr in enumerate(attrs)}
+        kwargs["ProjectionExpression"] = ", ".join(names)
+        kwargs["ExpressionAttributeNames"] = names
+
+    while True:
+        resp = history_table.query(**kwargs)
+        yield from resp.get("Items", [])
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def construir_timeline(history_original, event_history, historial, limit, cursor=None, fields=None):
+    """
+    Timeline paginado: merge en streaming de las listas legacy del pedido
+    (history / event_history, en orden de append) y de OrderHistoryTable
+    (ya cronológica, intercala ambos sources). Cada entrada se ordena por
+    (timestamp, desempate único); el cursor es la clave de la última entregada.
+
+    Devuelve (timeline, cursor siguiente o None).
+    """
+    def legacy(entries, prefix, kind):
+        for i, entry in enumerate(entries):
+            yield (entry.get("at") or entry.get("timestamp") or "", f"0#{prefix}#{i:06d}"), kind, entry
+
+    def tabla():
+        for entry in historial:
+            kind = SOURCE_EVENTBRIDGE if entry.get("source") == SOURCE_EVENTBRIDGE else SOURCE_WORKFLOW
+            yield (entry.get("timestamp") or "", entry.get("event_key", "")), kind, entry
+
+    desde = (cursor["ts"], cursor.get("k", "")) if cursor is not None else None
+    merged = heapq.merge(
+        legacy(history_original, "w", SOURCE_WORKFLOW),
+        legacy(event_history, "e", SOURCE_EVENTBRIDGE),
+        tabla(),
+        key=lambda t: t[0],
+    )
+
+    timeline, ultima = [], None
+    for sort_key, kind, entry in merged:
+        if desde is not None and sort_key <= desde:
+            continue
+        if len(timeline) == limit:
+            return timeline, {"ts": ultima[0], "k": ultima[1]}
+        formatear = entrada_evento if kind == SOURCE_EVENTBRIDGE else entrada_workflow
+        timeline.append(formatear(entry, fields))
+        ultima = sort_key
+
+    return timeline, None
+
+
+def entrada_workflow(entry, fields=None):
+    """Entrada del historial del flujo (lo escribe Orders + Fulfillment)."""
+    return proyectar({
+        "timestamp": entry.get("at") or entry.get("timestamp"),
+        "action": entry.get("action"),
+        "status": entry.get("status"),
+        "by": entry.get("by") or entry.get("staff_id"),
+        "staff_name": entry.get("staff_name"),
+        "reason": entry.get("reason", ""),
+        "source": SOURCE_WORKFLOW
+    }, fields)
+
+
+def entrada_evento(entry, fields=None):
+    """Entrada del historial de eventos (lo escribe Status Listener)."""
+    timeline_entry = {
+        "timestamp": entry.get("timestamp"),
+        "event_type": entry.get("event_type"),
+        "event_label": entry.get("event_label"),
+        "status": entry.get("status"),
+    }
+    # details copia el item: solo si se pide
+    if fields is None or "details" in fields:
+        timeline_entry["details"] = {k: v for k, v in entry.items() if k not in HISTORY_META_FIELDS}
+    timeline_entry["source"] = SOURCE_EVENTBRIDGE
+    return proyectar(timeline_entry, fields)
+
+
+def proyectar(timeline_entry, fields):
+    if fields is None:
+        return timeline_entry
+    return {k: v for k, v in timeline_entry.items() if k in fields or k in ("timestamp", "source")}
+
+
+def calcular_estadisticas(timeline, pedido, completo=True):
+    """
+    Estadísticas del pedido. Con una página parcial del timeline (completo=False)
+    eventos_totales no se conoce sin leer todo el historial: va en None.
+    """
+    if not timeline:
+        return {}
+
+    try:
+        created_at = pedido.get("created_at")
+        updated_at = pedido.get("updated_at")
+
+        if created_at and updated_at:
+            inicio = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+            fin = datetime.fromisoformat(updated_at.replace("Z", "+00:00"))
+            tiempo_total = (fin - inicio).total_seconds() / 60
+        else:
+            tiempo_total = 0
+
+        # pasos del flujo único: steps_completed en el pedido (CreateOrder + cada paso);
+        # los pedidos anteriores se cuentan en el timeline si está completo
+        if "steps_completed" in pedido:
+            pasos_completados = int(pedido["steps_completed"])
+        elif completo:
+            pasos_completados = len([
+                e for e in timeline
+                if e.get("action") in FLOW_ACTIONS
+            ])
+        else:
+            pasos_completados = None
+
+        return {
+            "tiempo_total_minutos": round(tiempo_total, 2),
+            "eventos_totales": len(timeline) if completo else None,
+            "pasos_completados": pasos_completados,
+            "estado_actual": pedido.get("status")
+        }
+
+    except Exception as e:
+        print(f"Error calculando estadísticas: {str(e)}")
+        return response(500, {"error": "No se pudieron calcular estadísticas"})
@@ -1,75 +1,100 @@
-import json
-import os
-import boto3
-from decimal import Decimal
-from utils import response
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(os.environ["ORDERS_TABLE"])
-
-def lambda_handler(event, context):
-    print(f"Request: {json.dumps(event)}")
-
-    try:
-        # -------- tenant obligatorio ----------
-        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
-        if not tenant_id:
-            return response(400,{"error": "x-tenant-id header es requerido"})
-            
-
-        order_id = (event.get("pathParameters") or {}).get("order_id")
-        if not order_id:
-            return response(400, {"error": "order_id es requerido"})
-            
-
-        # -------- get pedido con PK compuesta ----------
-        resp = table.get_item(Key={"tenant_id": tenant_id, "order_id": order_id})
-
-        if "Item" not in resp:
-            return response(404, {"error": "Pedido no encontrado"})
-            
-
-        pedido = resp["Item"]
-        status = pedido.get("status", "PENDIENTE")
-
-        resultado = {
-            "order_id": order_id,
-            "tenant_id": tenant_id,
-            "status": status,
-            "customer_id": pedido.get("customer_id"),
-            "items": clean_decimals(pedido.get("items", [])),
-            "total": float(pedido.get("total", 0)),
-            "created_at": pedido.get("created_at"),
-            "updated_at": pedido.get("updated_at"),
-            "progress": calcular_progreso(status)
-        }
-
-        return response(200,{resultado})
-        
-
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        return response(500, {"error": "Error interno del servidor",
-                "details": str(e)})
-        
-
-
-def calcular_progreso(status):
-    estados = {
-        "PENDIENTE": 10,
-        "COCINANDO": 40,
-        "EMPACANDO": 70,
-        "EN_REPARTO": 90,
-        "ENTREGADO": 100,
-        "CANCELADO": 0
-    }
-    return estados.get(status, 0)
-
-
-def clean_decimals(obj):
-    if isinstance(obj, list):
-        return [clean_decimals(i) for i in obj]
-    if isinstance(obj, dict):
-        return {k: clean_decimals(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    return obj
+import json
+import os
+from chinawok_common import aws, response, etag_for, etag_matches, if_none_match, not_modified, TTLCache
+table = aws.lazy_table(os.environ["ORDERS_TABLE"])
+
+# Caché por contenedor de los pedidos consultados en polling (segundos de atraso aceptados)
+STATUS_CACHE_TTL_SECONDS = float(os.environ.get("STATUS_CACHE_TTL_SECONDS", "2"))
+STATUS_CACHE_MAX_ENTRIES = int(os.environ.get("STATUS_CACHE_MAX_ENTRIES", "1000"))
+status_cache = TTLCache(STATUS_CACHE_TTL_SECONDS, STATUS_CACHE_MAX_ENTRIES)
+
+# Atributos de los que sale el ETag: cambian con cada paso del flujo (updated_at)
+# y con cada evento registrado por el listener (last_event_update)
+VERSION_PROJECTION = "updated_at, last_event_update"
+
+def lambda_handler(event, context):
+    print(f"Request: {json.dumps(event)}")
+
+    try:
+        # -------- tenant obligatorio ----------
+        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
+        if not tenant_id:
+            return response(400,{"error": "x-tenant-id header es requerido"})
+            
+
+        order_id = (event.get("pathParameters") or {}).get("order_id")
+        if not order_id:
+            return response(400, {"error": "order_id es requerido"})
+            
+
+        key = {"tenant_id": tenant_id, "order_id": order_id}
+        etags_cliente = if_none_match(event)
+
+        # -------- caché del contenedor ----------
+        # (resultado None: solo se conoce el ETag, de un 304 anterior)
+        cached = status_cache.get((tenant_id, order_id))
+        if cached:
+            etag, resultado = cached
+            if etag_matches(etags_cliente, etag):
+                return not_modified(etag)
+            if resultado is not None:
+                return response(200, resultado, headers={"ETag": etag})
+
+        # -------- If-None-Match: solo se leen los atributos de versión ----------
+        if etags_cliente:
+            resp = table.get_item(Key=key, ProjectionExpression=VERSION_PROJECTION)
+            if "Item" not in resp:
+                return response(404, {"error": "Pedido no encontrado"})
+            etag = pedido_etag(resp["Item"])
+            if etag_matches(etags_cliente, etag):
+                status_cache.put((tenant_id, order_id), (etag, None))
+                return not_modified(etag)
+
+        # -------- get pedido con PK compuesta ----------
+        resp = table.get_item(Key=key)
+
+        if "Item" not in resp:
+            return response(404, {"error": "Pedido no encontrado"})
+            
+
+        pedido = resp["Item"]
+        status = pedido.get("status", "PENDIENTE")
+
+        resultado = {
+            "order_id": order_id,
+            "tenant_id": tenant_id,
+            "status": status,
+            "customer_id": pedido.get("customer_id"),
+            "items": pedido.get("items", []),
+            "total": float(pedido.get("total", 0)),
+            "created_at": pedido.get("created_at"),
+            "updated_at": pedido.get("updated_at"),
+            "progress": calcular_progreso(status)
+        }
+
+        etag = pedido_etag(pedido)
+        status_cache.put((tenant_id, order_id), (etag, resultado))
+        return response(200, resultado, headers={"ETag": etag})
+        
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return response(500, {"error": "Error interno del servidor",
+                "details": str(e)})
+        
+
+
+def pedido_etag(pedido):
+    return etag_for(pedido.get("updated_at"), pedido.get("last_event_update"))
+
+
+def calcular_progreso(status):
+    estados = {
+        "PENDIENTE": 10,
+        "COCINANDO": 40,
+        "EMPACANDO": 70,
+        "EN_REPARTO": 90,
+        "ENTREGADO": 100,
+        "CANCELADO": 0
+    }
+    return estados.get(status, 0)
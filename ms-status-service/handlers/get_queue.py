@@ -0,0 +1,91 @@
+import json
+import os
+from boto3.dynamodb.conditions import Key
+from datetime import datetime, timezone
+from chinawok_common import aws, response, parse_limit, encode_cursor, decode_cursor
+table = aws.lazy_table(os.environ["ORDERS_TABLE"])
+
+# Pasos humanos del flujo (pending_step) -> estación que los atiende
+QUEUE_STEPS = {
+    "ASSIGN_COOK": "cocina",
+    "PACK": "empaque",
+    "ASSIGN_DELIVERY": "despacho",
+    "MARK_DELIVERED": "reparto",
+}
+
+def lambda_handler(event, context):
+    # Solo ruta y query: el evento completo trae headers (tokens) y se loguea en cada poll
+    print(f"Request: {event.get('path')} {json.dumps(event.get('queryStringParameters') or {})}")
+
+    try:
+        # -------- tenant obligatorio ----------
+        tenant_id = (event.get("headers") or {}).get("x-tenant-id")
+        if not tenant_id:
+            return response(400, {"error": "x-tenant-id header es requerido"})
+
+        step = ((event.get("pathParameters") or {}).get("step") or "").upper()
+        if step not in QUEUE_STEPS:
+            return response(400, {"error": f"step inválido. Válidos: {', '.join(QUEUE_STEPS)}"})
+
+        # -------- paginación: limit + cursor opaco ----------
+        params = event.get("queryStringParameters") or {}
+        try:
+            limit = parse_limit(params)
+            start_key = decode_cursor(params.get("cursor"))
+        except ValueError:
+            return response(400, {"error": "limit o cursor inválido"})
+
+        prefix = f"{step}#"
+        if start_key and (
+            start_key.get("tenant_id") != tenant_id
+            or not str(start_key.get("pending_key", "")).startswith(prefix)
+        ):
+            return response(400, {"error": "limit o cursor inválido"})
+
+        # -------- Query al índice sparse: solo pedidos esperando este paso ----------
+        query_kwargs = {
+            "IndexName": "PendingStepIndex",
+            "KeyConditionExpression":
+                Key("tenant_id").eq(tenant_id) & Key("pending_key").begins_with(prefix),
+            "ScanIndexForward": True,  # FIFO: el que espera hace más tiempo primero
+            "Limit": limit,
+        }
+        if start_key:
+            query_kwargs["ExclusiveStartKey"] = start_key
+
+        resp = table.query(**query_kwargs)
+
+        pedidos = [
+            {
+                "order_id": p.get("order_id"),
+                "customer_id": p.get("customer_id"),
+                "items": p.get("items", []),
+                "created_at": p.get("created_at"),
+                "waiting_since": p.get("pending_updated_at"),
+                "waiting_minutes": minutos_desde(p.get("pending_updated_at")),
+            }
+            for p in resp.get("Items", [])
+        ]
+
+        return response(200, {
+            "tenant_id": tenant_id,
+            "step": step,
+            "station": QUEUE_STEPS[step],
+            "orders": pedidos,
+            "count": len(pedidos),
+            "next_cursor": encode_cursor(resp.get("LastEvaluatedKey"))
+        })
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return response(500, {"error": str(e)})
+
+
+def minutos_desde(timestamp):
+    if not timestamp:
+        return 0
+    try:
+        desde = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        return round((datetime.now(timezone.utc) - desde).total_seconds() / 60, 1)
+    except ValueError:
+        return 0
@@ -0,0 +1,58 @@
+import json
+from realtime import ConnectionStore, order_topic, tenant_topic
+
+store = ConnectionStore()
+
+
+def ws_response(status_code, body=None):
+    resp = {"statusCode": status_code}
+    if body is not None:
+        resp["body"] = json.dumps(body)
+    return resp
+
+
+def connect(event, context):
+    """
+    $connect: wss://.../{stage}?tenant_id=<tenant>
+    (los navegadores no pueden mandar headers en WebSocket; se acepta también x-tenant-id)
+    """
+    connection_id = event["requestContext"]["connectionId"]
+    params = event.get("queryStringParameters") or {}
+    tenant_id = params.get("tenant_id") or (event.get("headers") or {}).get("x-tenant-id")
+    if not tenant_id:
+        return ws_response(400, {"error": "tenant_id es requerido"})
+
+    store.register(connection_id, tenant_id)
+    return ws_response(200)
+
+
+def disconnect(event, context):
+    """$disconnect: borra la conexión y sus suscripciones."""
+    store.remove(event["requestContext"]["connectionId"])
+    return ws_response(200)
+
+
+def subscribe(event, context):
+    """
+    Ruta "subscribe" (routeSelectionExpression $request.body.action):
+      {"action": "subscribe"}                       -> todos los pedidos del tenant (tablero)
+      {"action": "subscribe", "order_id": "abc-123"} -> un pedido
+    El tenant es el de la conexión: no se puede escuchar otro tenant.
+    """
+    connection_id = event["requestContext"]["connectionId"]
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return ws_response(400, {"error": "Invalid JSON body"})
+
+    connection = store.get_connection(connection_id)
+    if not connection:
+        return ws_response(410, {"error": "Conexión no registrada"})
+
+    tenant_id = connection["tenant_id"]
+    order_id = body.get("order_id")
+    topic = order_topic(tenant_id, order_id) if order_id else tenant_topic(tenant_id)
+
+    store.subscribe(connection_id, topic, int(connection["expires_at"]))
+    return ws_response(200, {"subscribed": topic})
@@ -0,0 +1,278 @@
+# realtime.py: suscripciones WebSocket y fan-out de cambios de estado
+#
+# CONNECTIONS_TABLE (PK topic, SK connection_id, TTL expires_at):
+#   topic = "conn#<connection_id>"          -> la conexión (tenant con el que se abrió)
+#   topic = "tenant#<tenant_id>"            -> suscripción al tablero del tenant
+#   topic = "order#<tenant_id>#<order_id>"  -> suscripción a un pedido
+# GSI ConnectionIndex (connection_id) para borrar todo lo de una conexión al desconectar.
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Attr, Key
+from chinawok_common import aws, dumps
+
+# API Gateway corta las conexiones WebSocket a las 2 h; el TTL limpia lo que
+# $disconnect no alcanzó a borrar
+CONNECTION_TTL_SECONDS = int(os.environ.get("CONNECTION_TTL_SECONDS", str(2 * 3600 + 600)))
+FANOUT_MAX_WORKERS = int(os.environ.get("FANOUT_MAX_WORKERS", "16"))
+# Conexiones por tanda de envíos en paralelo
+FANOUT_BATCH_SIZE = int(os.environ.get("FANOUT_BATCH_SIZE", "200"))
+
+
+def connection_topic(connection_id):
+    return f"conn#{connection_id}"
+
+
+def tenant_topic(tenant_id):
+    return f"tenant#{tenant_id}"
+
+
+def order_topic(tenant_id, order_id):
+    return f"order#{tenant_id}#{order_id}"
+
+
+def error_code(e):
+    return getattr(e, "response", {}).get("Error", {}).get("Code")
+
+
+# ---------------------------
+# Conexiones y suscripciones
+# ---------------------------
+class ConnectionStore:
+    """Conexiones y suscripciones en CONNECTIONS_TABLE."""
+
+    def __init__(self, table_name=None):
+        self.table = aws.lazy_table(table_name or os.environ["CONNECTIONS_TABLE"])
+
+    def register(self, connection_id, tenant_id):
+        self.table.put_item(Item={
+            "topic": connection_topic(connection_id),
+            "connection_id": connection_id,
+            "tenant_id": tenant_id,
+            "expires_at": int(time.time()) + CONNECTION_TTL_SECONDS,
+        })
+
+    def get_connection(self, connection_id):
+        res = self.table.get_item(
+            Key={"topic": connection_topic(connection_id), "connection_id": connection_id}
+        )
+        return res.get("Item")
+
+    def subscribe(self, connection_id, topic, expires_at):
+        # Misma expiración que la conexión: no sobrevive a ella
+        self.table.put_item(Item={
+            "topic": topic,
+            "connection_id": connection_id,
+            "expires_at": expires_at,
+        })
+
+    def subscribers(self, topic):
+        """connection_id suscritos a un topic (paginado; ignora los ya vencidos)."""
+        query_kwargs = {
+            "KeyConditionExpression": Key("topic").eq(topic),
+            # TTL borra con retraso: se filtran los vencidos
+            "FilterExpression": Attr("expires_at").gt(int(time.time())),
+            "ProjectionExpression": "connection_id",
+        }
+        while True:
+            resp = self.table.query(**query_kwargs)
+            for item in resp.get("Items", []):
+                yield item["connection_id"]
+            if "LastEvaluatedKey" not in resp:
+                return
+            query_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    def remove(self, connection_id):
+        """Borra la conexión y todas sus suscripciones (ConnectionIndex + batch_writer)."""
+        keys = []
+        query_kwargs = {
+            "IndexName": "ConnectionIndex",
+            "KeyConditionExpression": Key("connection_id").eq(connection_id),
+        }
+        while True:
+            resp = self.table.query(**query_kwargs)
+            keys.extend({"topic": i["topic"], "connection_id": i["connection_id"]} for i in resp.get("Items", []))
+            if "LastEvaluatedKey" not in resp:
+                break
+            query_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+        with self.table.batch_writer() as batch:
+            for key in keys:
+                batch.delete_item(Key=key)
+
+    def remove_subscription(self, topic, connection_id):
+        self.table.delete_item(Key={"topic": topic, "connection_id": connection_id})
+
+
+class InMemoryConnectionStore:
+    """
+    Misma interfaz que ConnectionStore sobre dicts (pruebas y benchmarks locales).
+    Todo acceso a items va bajo el lock: fan_out_tenant lee desde un pool de hilos
+    mientras otros registran o quitan conexiones.
+    """
+
+    def __init__(self):
+        self.items = {}
+        self._lock = threading.Lock()
+
+    def register(self, connection_id, tenant_id):
+        with self._lock:
+            self.items[(connection_topic(connection_id), connection_id)] = {
+                "connection_id": connection_id,
+                "tenant_id": tenant_id,
+                "expires_at": int(time.time()) + CONNECTION_TTL_SECONDS,
+            }
+
+    def get_connection(self, connection_id):
+        with self._lock:
+            return self.items.get((connection_topic(connection_id), connection_id))
+
+    def subscribe(self, connection_id, topic, expires_at):
+        with self._lock:
+            self.items[(topic, connection_id)] = {"connection_id": connection_id, "expires_at": expires_at}
+
+    def subscribers(self, topic):
+        now = int(time.time())
+        with self._lock:
+            snapshot = list(self.items.items())
+        return [
+            connection_id
+            for (item_topic, connection_id), item in snapshot
+            if item_topic == topic and item["expires_at"] > now
+        ]
+
+    def remove(self, connection_id):
+        with self._lock:
+            for key in [k for k in self.items if k[1] == connection_id]:
+                del self.items[key]
+
+    def remove_subscription(self, topic, connection_id):
+        with self._lock:
+            self.items.pop((topic, connection_id), None)
+
+
+# ---------------------------
+# API de administración de conexiones
+# ---------------------------
+class GoneConnection(Exception):
+    """Mismo código de error que GoneException del cliente real."""
+
+    def __init__(self, connection_id):
+        super().__init__(f"Conexión {connection_id} cerrada")
+        self.response = {"Error": {"Code": "GoneException"}}
+
+
+class LocalConnectionsApi:
+    """
+    Sustituto local de apigatewaymanagementapi: guarda los mensajes por conexión
+    y simula la latencia de cada post_to_connection. Las conexiones no abiertas
+    con connect() responden GoneException.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.connections = set()
+        self.messages = {}
+        self._lock = threading.Lock()
+
+    def connect(self, connection_id):
+        self.connections.add(connection_id)
+
+    def disconnect(self, connection_id):
+        self.connections.discard(connection_id)
+
+    def post_to_connection(self, ConnectionId, Data):
+        if self.latency:
+            time.sleep(self.latency)
+        if ConnectionId not in self.connections:
+            raise GoneConnection(ConnectionId)
+        with self._lock:
+            self.messages.setdefault(ConnectionId, []).append(Data)
+
+
+def connections_api():
+    """
+    Cliente de administración de conexiones del API WebSocket
+    (WEBSOCKET_API_ENDPOINT = https://{api-id}.execute-api.{region}.amazonaws.com/{stage}).
+    None si el servicio se despliega sin WebSocket.
+    """
+    endpoint = os.environ.get("WEBSOCKET_API_ENDPOINT")
+    if not endpoint:
+        return None
+    return aws.lazy_client("apigatewaymanagementapi", endpoint_url=endpoint)
+
+
+# ---------------------------
+# Fan-out
+# ---------------------------
+def status_message(event_type, detail):
+    """Mensaje que reciben los suscriptores (sin items ni datos del cliente)."""
+    return {
+        "type": "order_status",
+        "event_type": event_type,
+        "order_id": detail.get("order_id"),
+        "tenant_id": detail.get("tenant_id"),
+        "status": detail.get("status"),
+        "timestamp": detail.get("timestamp") or detail.get("event_time"),
+    }
+
+
+def fan_out(store, api, tenant_id, order_id, message):
+    """Envía `message` a los suscriptores del tenant o del pedido (ver fan_out_tenant)."""
+    return fan_out_tenant(store, api, tenant_id, {order_id: message})
+
+
+def fan_out_tenant(store, api, tenant_id, messages):
+    """
+    Envía los mensajes de varios pedidos de un tenant ({order_id: message}) en una
+    pasada: los suscriptores del tenant se consultan una sola vez y cada conexión
+    recibe cada mensaje una vez aunque esté suscrita al tenant y al pedido.
+    Envíos en tandas de FANOUT_BATCH_SIZE con FANOUT_MAX_WORKERS en paralelo; las
+    conexiones cerradas (GoneException) se borran una vez.
+    Devuelve {"sent", "gone", "failed"}.
+    """
+    counts = {"sent": 0, "gone": 0, "failed": 0}
+    if not messages:
+        return counts
+
+    tenant_subscribers = list(store.subscribers(tenant_topic(tenant_id)))
+    sends = []
+    for order_id, message in messages.items():
+        targets = dict.fromkeys(tenant_subscribers)
+        for connection_id in store.subscribers(order_topic(tenant_id, order_id)):
+            targets.setdefault(connection_id)
+        data = dumps(message).encode("utf-8")
+        sends.extend((connection_id, data) for connection_id in targets)
+
+    if not sends:
+        return counts
+
+    gone = set()
+    gone_lock = threading.Lock()
+
+    def send(target):
+        connection_id, data = target
+        if connection_id in gone:
+            return None
+        try:
+            api.post_to_connection(ConnectionId=connection_id, Data=data)
+            return "sent"
+        except Exception as e:
+            if error_code(e) == "GoneException":
+                with gone_lock:
+                    if connection_id in gone:
+                        return None
+                    gone.add(connection_id)
+                store.remove(connection_id)
+                return "gone"
+            print(f"Error enviando a {connection_id}: {str(e)}")
+            return "failed"
+
+    with ThreadPoolExecutor(max_workers=min(FANOUT_MAX_WORKERS, len(sends))) as pool:
+        for start in range(0, len(sends), FANOUT_BATCH_SIZE):
+            for outcome in pool.map(send, sends[start:start + FANOUT_BATCH_SIZE]):
+                if outcome:
+                    counts[outcome] += 1
+
+    return counts
@@ -0,0 +1,59 @@
+"""
+Backfill de tenant_registry en los items ALL de TenantStats.
+
+El listener marca el item ALL de cada tenant con tenant_registry = "TENANT" en
+cada evento (GSI sparse TenantIndex, del que el watchdog de SLA de
+ms-cumplimiento saca la lista de tenants). Los tenants sin eventos desde ese
+cambio no tienen la marca: este script, de una sola corrida, la agrega.
+
+Es un scan de TenantStats (un item ALL por tenant más los DAY#): migración
+puntual, no corre en el request path. Cada escritura es condicional
+(attribute_exists), se puede repetir sin efectos.
+
+Uso (desde ms-status-service):
+
+    TENANT_STATS_TABLE=... PYTHONPATH=../layers/chinawok_common/python \\
+        python scripts/backfill_tenant_registry.py [--dry-run]
+"""
+import argparse
+import sys
+
+from chinawok_common import aws, tenant_stats_table_name, STATS_KEY_ALL
+from chinawok_common.tenant_stats import TENANT_REGISTRY_KEY
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    table = aws.table(tenant_stats_table_name())
+    scan_kwargs = {
+        "ProjectionExpression": "tenant_id, stats_key",
+        "FilterExpression": "stats_key = :all AND attribute_not_exists(tenant_registry)",
+        "ExpressionAttributeValues": {":all": STATS_KEY_ALL},
+    }
+    marked = 0
+    while True:
+        resp = table.scan(**scan_kwargs)
+        for item in resp.get("Items", []):
+            marked += 1
+            if args.dry_run:
+                continue
+            table.update_item(
+                Key={"tenant_id": item["tenant_id"], "stats_key": STATS_KEY_ALL},
+                UpdateExpression="SET tenant_registry = :registry",
+                ConditionExpression="attribute_exists(tenant_id)",
+                ExpressionAttributeValues={":registry": TENANT_REGISTRY_KEY},
+            )
+        if "LastEvaluatedKey" not in resp:
+            break
+        scan_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    prefix = "[dry-run] " if args.dry_run else ""
+    print(f"{prefix}{marked} tenants marcados en TenantIndex")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())